@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the MAX! Cube library
+Compares the current decoders against the implementations they replaced,
+on payloads generated by the cube simulator. No hardware needed.
+
+Run:  python3 benchmark_maxcube.py --devices 200
+"""
+
+import argparse
+import base64
+import struct
+import timeit
+import tracemalloc
+
+from cube_simulator import MaxCubeSimulator, load_library
+
+lib = load_library()
+
+MODEL_FILES = tuple(module.__file__ for module in (lib.device, lib.thermostat, lib.wallthermostat,
+                                                    lib.windowshutter, lib.room))
+
+
+def legacy_parse_l_message(cube, message, devices_by_rf):
+    """L: decoder as it was before the struct based rewrite, with hex string rf keys"""
+    data = bytearray(base64.b64decode(message[2:]))
+    pos = 0
+
+    while pos < len(data):
+        length = data[pos]
+        device_rf_address = ''.join('{:02X}'.format(x) for x in data[pos + 1: pos + 4])
+
+        device = devices_by_rf.get(device_rf_address)
+
+        if device:
+            bits1, bits2 = struct.unpack('BB', bytearray(data[pos + 5: pos + 7]))
+            device.battery = bits2 >> 7
+
+        if device and (cube.is_thermostat(device) or cube.is_wallthermostat(device)):
+            device.target_temperature = (data[pos + 8] & 0x7F) / 2.0
+            bits1, bits2 = struct.unpack('BB', bytearray(data[pos + 5: pos + 7]))
+            device.mode = bits2 & 3
+
+        if device and cube.is_thermostat(device):
+            device.valve_position = data[pos + 7]
+            if device.mode == 0 or device.mode == 1:
+                actual_temperature = ((data[pos + 9] & 0xFF) * 256 + (data[pos + 10] & 0xFF)) / 10.0
+                if actual_temperature != 0:
+                    device.actual_temperature = actual_temperature
+            else:
+                device.actual_temperature = None
+
+        if device and cube.is_wallthermostat(device):
+            device.actual_temperature = (((data[pos + 8] & 0x80) << 1) + data[pos + 12]) / 10.0
+
+        if device and cube.is_windowshutter(device):
+            device.is_open = (data[pos + 6] & 0x03) > 0
+
+        pos += length + 1
+
+
+class LegacyDevice(object):
+    """Device model as it was before __slots__, with a per-instance __dict__"""
+
+    def __init__(self):
+        self.type = None
+        self.rf_address = None
+        self.room_id = None
+        self.name = None
+        self.serial = None
+        self.battery = None
+
+
+class LegacyThermostat(LegacyDevice):
+    def __init__(self):
+        super(LegacyThermostat, self).__init__()
+        self.comfort_temperature = None
+        self.eco_temperature = None
+        self.max_temperature = None
+        self.min_temperature = None
+        self.valve_position = None
+        self.target_temperature = None
+        self.actual_temperature = None
+        self.mode = None
+
+
+class LegacyWallThermostat(LegacyDevice):
+    def __init__(self):
+        super(LegacyWallThermostat, self).__init__()
+        self.comfort_temperature = None
+        self.eco_temperature = None
+        self.max_temperature = None
+        self.min_temperature = None
+        self.actual_temperature = None
+        self.target_temperature = None
+        self.mode = None
+
+
+class LegacyWindowShutter(LegacyDevice):
+    def __init__(self):
+        super(LegacyWindowShutter, self).__init__()
+        self.is_open = False
+        self.initialized = None
+
+
+class LegacyRoom(object):
+    def __init__(self):
+        self.id = None
+        self.name = None
+
+
+def build_simulator(devices):
+    """Spread roughly `devices` devices over rooms of 8 thermostats, a wall thermostat and a window"""
+    rooms = max(1, devices // 10)
+    simulator = MaxCubeSimulator(rooms=rooms, thermostats=8, wall_thermostats=1, window_shutters=1)
+    for index, device in enumerate(simulator.devices):
+        device.mode = index % 4
+        device.battery_low = index % 7 == 0
+        device.is_open = index % 3 == 0
+        device.actual_temperature = 18.0 + (index % 50) / 10.0
+    return simulator
+
+
+def build_cube(simulator):
+    cube = lib.cube.MaxCube(None, auto_init=False)
+    cube.parse_response(simulator.greeting())
+    return cube
+
+
+def device_state(cube):
+    return [(d.rf_address, d.battery, getattr(d, 'mode', None), getattr(d, 'target_temperature', None),
+             getattr(d, 'actual_temperature', None), getattr(d, 'valve_position', None),
+             getattr(d, 'is_open', None)) for d in cube.devices]
+
+
+def benchmark_live_status(devices, number):
+    simulator = build_simulator(devices)
+    message = simulator.l_message()
+
+    legacy_cube = build_cube(simulator)
+    cube = build_cube(simulator)
+    legacy_index = {device.rf_address: device for device in legacy_cube.devices}
+    legacy_parse_l_message(legacy_cube, message, legacy_index)
+    cube.parse_l_message(message)
+    assert device_state(cube) == device_state(legacy_cube), 'decoders disagree'
+
+    legacy = min(timeit.repeat(lambda: legacy_parse_l_message(legacy_cube, message, legacy_index), number=number, repeat=5))
+    current = min(timeit.repeat(lambda: cube.parse_l_message(message), number=number, repeat=5))
+
+    print(f"L: decoding, {len(cube.devices)} devices, {len(message)} bytes")
+    print(f"  legacy : {legacy / number * 1e6:8.1f} µs per message")
+    print(f"  current: {current / number * 1e6:8.1f} µs per message")
+    print(f"  speedup: {legacy / current:8.2f}x")
+
+
+def measure_model(simulator, device_classes, room_class, rf_as_int):
+    """Bytes allocated for one device and room model of the simulated install"""
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    rooms = []
+    for room_id, name in simulator.rooms.items():
+        room = room_class()
+        room.id = room_id
+        room.name = name
+        rooms.append(room)
+    devices = []
+    for simulated in simulator.devices:
+        device = device_classes[simulated.type]()
+        device.type = simulated.type
+        # As after M parsing: the legacy parser built a hex string per
+        # device, the current one hands over the integer
+        if rf_as_int:
+            device.rf_address = simulated.rf_address
+        else:
+            device.rf_address = '%06X' % simulated.rf_address
+        device.room_id = simulated.room_id
+        device.name = simulated.name
+        device.serial = simulated.serial
+        device.battery = 0
+        if hasattr(device, 'target_temperature'):
+            device.target_temperature = simulated.target_temperature
+            device.actual_temperature = simulated.actual_temperature
+            device.mode = simulated.mode
+        devices.append(device)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    # Only count the model objects, not the shared strings they point to
+    stats = after.compare_to(before, 'filename')
+    size = sum(stat.size_diff for stat in stats if stat.traceback[0].filename in (__file__, *MODEL_FILES))
+    return size, devices, rooms
+
+
+def benchmark_memory(devices):
+    simulator = build_simulator(devices)
+    legacy_classes = {1: LegacyThermostat, 3: LegacyWallThermostat, 4: LegacyWindowShutter}
+    current_classes = {1: lib.thermostat.MaxThermostat, 3: lib.wallthermostat.MaxWallThermostat,
+                       4: lib.windowshutter.MaxWindowShutter}
+
+    legacy, _, _ = measure_model(simulator, legacy_classes, LegacyRoom, rf_as_int=False)
+    current, _, _ = measure_model(simulator, current_classes, lib.room.MaxRoom, rf_as_int=True)
+
+    print(f"Device model, {len(simulator.devices)} devices in {len(simulator.rooms)} rooms")
+    print(f"  legacy : {legacy / 1024:8.1f} KiB")
+    print(f"  current: {current / 1024:8.1f} KiB")
+    print(f"  saving : {(1 - current / legacy) * 100:8.1f} %")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='MAX! Cube library micro-benchmarks')
+    parser.add_argument('--devices', type=int, default=200)
+    parser.add_argument('--number', type=int, default=2000)
+    args = parser.parse_args()
+
+    benchmark_live_status(args.devices, args.number)
+    benchmark_memory(args.devices)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+Simulated MAX! Cube for tests and benchmarks
+Speaks the cube's TCP line protocol (H/M/C/L greeting, l:, s:, q:) for a
+configurable number of rooms and devices, with optional latency, packet
+fragmentation and dropped connections. No hardware needed.
+
+Run standalone:  python3 cube_simulator.py --rooms 10 --thermostats 2 --port 62910
+"""
+
+import argparse
+import base64
+import importlib
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+import types
+
+COMPONENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'custom_components', 'maxcube')
+
+MAX_THERMOSTAT = 1
+MAX_WALL_THERMOSTAT = 3
+MAX_WINDOW_SHUTTER = 4
+
+CUBE_SERIAL = 'KEQ0000001'
+CUBE_RF_ADDRESS = 0x0ABCDE
+
+
+def load_library(name='maxcube_lib'):
+    """Import the cube library modules without the Home Assistant package __init__"""
+    if name not in sys.modules:
+        package = types.ModuleType(name)
+        package.__path__ = [COMPONENT_DIR]
+        sys.modules[name] = package
+    return types.SimpleNamespace(
+        capture=importlib.import_module(name + '.capture'),
+        cube=importlib.import_module(name + '.cube'),
+        connection=importlib.import_module(name + '.connection'),
+        const=importlib.import_module(name + '.const'),
+        device=importlib.import_module(name + '.device'),
+        parser=importlib.import_module(name + '.parser'),
+        polling=importlib.import_module(name + '.polling'),
+        room=importlib.import_module(name + '.room'),
+        scheduler=importlib.import_module(name + '.scheduler'),
+        snapshot=importlib.import_module(name + '.snapshot'),
+        telemetry=importlib.import_module(name + '.telemetry'),
+        thermostat=importlib.import_module(name + '.thermostat'),
+        wallthermostat=importlib.import_module(name + '.wallthermostat'),
+        windowshutter=importlib.import_module(name + '.windowshutter'),
+    )
+
+
+class SimulatedDevice:
+    """State of one simulated device"""
+
+    def __init__(self, device_type, rf_address, room_id, name, serial):
+        self.type = device_type
+        self.rf_address = rf_address
+        self.room_id = room_id
+        self.name = name
+        self.serial = serial
+        self.mode = 0
+        self.target_temperature = 20.0
+        self.actual_temperature = 19.5
+        self.valve_position = 0
+        self.is_open = False
+        self.battery_low = False
+
+    @property
+    def rf_hex(self):
+        return '%06X' % self.rf_address
+
+
+class MaxCubeSimulator:
+    """Local TCP server that behaves like a MAX! Cube"""
+
+    def __init__(self, rooms=2, thermostats=2, wall_thermostats=0, window_shutters=0,
+                 host='127.0.0.1', port=0, latency=0.0, fragment_size=None,
+                 disconnect_after=None, duty_cycle=0, duty_cycle_step=1, free_memory_slots=0x32):
+        """Device counts are per room; latency is seconds before every reply and
+        between fragments; disconnect_after closes a session after that many commands."""
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.fragment_size = fragment_size
+        self.disconnect_after = disconnect_after
+        self.duty_cycle = duty_cycle
+        self.duty_cycle_step = duty_cycle_step
+        self.free_memory_slots = free_memory_slots
+        self.discard_commands = False
+        # False leaves s: unanswered, like a cube that lost the command
+        self.answer_commands = True
+
+        self.rooms = {}
+        self.devices = []
+        self.commands = []
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._clients = set()
+        self._server = None
+        self._thread = None
+
+        next_rf = 0x100001
+        for room_id in range(1, rooms + 1):
+            self.rooms[room_id] = 'Room %d' % room_id
+            for kind, count, label in ((MAX_THERMOSTAT, thermostats, 'Thermostat'),
+                                       (MAX_WALL_THERMOSTAT, wall_thermostats, 'Wall'),
+                                       (MAX_WINDOW_SHUTTER, window_shutters, 'Window')):
+                for index in range(1, count + 1):
+                    device = SimulatedDevice(kind, next_rf, room_id, '%s %d' % (label, index),
+                                             'KEQ%07d' % (next_rf & 0xFFFFF))
+                    device.valve_position = (next_rf * 7) % 100 if kind == MAX_THERMOSTAT else 0
+                    self.devices.append(device)
+                    next_rf += 1
+
+    # Protocol messages
+
+    def h_message(self):
+        return 'H:%s,%06x,0113,00000000,477719c0,%02x,%02x,0d0c09,1404,03,0000' % (
+            CUBE_SERIAL, CUBE_RF_ADDRESS, self.duty_cycle, self.free_memory_slots)
+
+    def m_message(self):
+        data = bytearray([0x56, 0x02, len(self.rooms)])
+        for room_id, name in self.rooms.items():
+            encoded = name.encode('utf-8')
+            group = next((d.rf_address for d in self.devices if d.room_id == room_id), 0)
+            data += bytes([room_id, len(encoded)]) + encoded + group.to_bytes(3, 'big')
+        data.append(len(self.devices))
+        for device in self.devices:
+            encoded = device.name.encode('utf-8')
+            data += bytes([device.type]) + device.rf_address.to_bytes(3, 'big')
+            data += device.serial.encode('utf-8')[:10].ljust(10, b'0')
+            data += bytes([len(encoded)]) + encoded + bytes([device.room_id])
+        data.append(0x01)
+        return 'M:00,01,' + base64.b64encode(bytes(data)).decode('utf-8')
+
+    def c_messages(self):
+        messages = []
+        for device in self.devices:
+            data = bytearray(22)
+            data[0] = len(data) - 1
+            data[1:4] = device.rf_address.to_bytes(3, 'big')
+            data[4] = device.type
+            data[5] = device.room_id if device.type != MAX_WINDOW_SHUTTER else 1
+            data[8:18] = device.serial.encode('utf-8')[:10].ljust(10, b'0')
+            data[18] = 42  # comfort 21.0
+            data[19] = 34  # eco 17.0
+            data[20] = 60  # max 30.0
+            data[21] = 10  # min 5.0
+            messages.append('C:%s,%s' % (device.rf_hex.lower(), base64.b64encode(bytes(data)).decode('utf-8')))
+        return messages
+
+    def l_message(self):
+        data = bytearray()
+        for device in self.devices:
+            flags = 0x10 | (device.mode & 0x03) | (0x80 if device.battery_low else 0)
+            rf = device.rf_address.to_bytes(3, 'big')
+            if device.type == MAX_THERMOSTAT:
+                actual = int(round(device.actual_temperature * 10))
+                data += bytes([11]) + rf + bytes([0, 0x12, flags, device.valve_position,
+                                                  int(device.target_temperature * 2) & 0x7F,
+                                                  (actual >> 8) & 0xFF, actual & 0xFF, 0])
+            elif device.type == MAX_WALL_THERMOSTAT:
+                actual = int(round(device.actual_temperature * 10))
+                data += bytes([12]) + rf + bytes([0, 0x12, flags, 0,
+                                                  (int(device.target_temperature * 2) & 0x7F) | ((actual >> 1) & 0x80),
+                                                  0, 0, 0, actual & 0xFF])
+            elif device.type == MAX_WINDOW_SHUTTER:
+                data += bytes([6]) + rf + bytes([0, 0x12, (flags & 0xFC) | (0x02 if device.is_open else 0)])
+        return 'L:' + base64.b64encode(bytes(data)).decode('utf-8')
+
+    def greeting(self):
+        return '\r\n'.join([self.h_message(), self.m_message()] + self.c_messages() + [self.l_message()]) + '\r\n'
+
+    def device_by_rf(self, rf_address):
+        if isinstance(rf_address, str):
+            rf_address = int(rf_address, 16)
+        return next((d for d in self.devices if d.rf_address == rf_address), None)
+
+    def handle_command(self, line):
+        """Return the reply for one command line, None to close the session"""
+        with self._lock:
+            self.commands.append(line)
+            command = line[:2].lower()
+            if command == 'l:':
+                return self.l_message() + '\r\n'
+            if command == 's:':
+                if not self.answer_commands:
+                    return ''
+                return self._handle_set(line[2:]) + '\r\n'
+            if command == 'q:':
+                return None
+            return ''
+
+    def _handle_set(self, payload):
+        data = base64.b64decode(payload)
+        accepted = not self.discard_commands and self.duty_cycle < 100 and self.free_memory_slots > 0
+        device = self.device_by_rf(int.from_bytes(data[6:9], 'big')) if len(data) >= 11 else None
+        if accepted and device:
+            device.target_temperature = (data[10] & 0x3F) / 2.0
+            device.mode = data[10] >> 6
+            self.duty_cycle = min(100, self.duty_cycle + self.duty_cycle_step)
+        return 'S:%02x,%d,%02x' % (self.duty_cycle, 0 if accepted else 1, self.free_memory_slots)
+
+    # Server
+
+    def start(self):
+        simulator = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                simulator._serve(self.request)
+
+        class Server(socketserver.ThreadingTCPServer):
+            allow_reuse_address = True
+            daemon_threads = True
+
+        self._server = Server((self.host, self.port), Handler)
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.drop_connections()
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def drop_connections(self):
+        """Close every open client session, like a cube reboot would"""
+        with self._lock:
+            clients = list(self._clients)
+        for client in clients:
+            try:
+                client.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    @property
+    def address(self):
+        return self.host, self.port
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _serve(self, client):
+        with self._lock:
+            self.connections += 1
+            self._clients.add(client)
+        try:
+            self._write(client, self.greeting())
+            buffer = b''
+            handled = 0
+            while True:
+                data = client.recv(4096)
+                if not data:
+                    return
+                buffer += data
+                while b'\n' in buffer:
+                    line, buffer = buffer.split(b'\n', 1)
+                    line = line.decode('utf-8').strip()
+                    if not line:
+                        continue
+                    reply = self.handle_command(line)
+                    if reply is None:
+                        return
+                    self._write(client, reply)
+                    handled += 1
+                    if self.disconnect_after is not None and handled >= self.disconnect_after:
+                        return
+        except OSError:
+            pass
+        finally:
+            with self._lock:
+                self._clients.discard(client)
+            client.close()
+
+    def _write(self, client, text):
+        data = text.encode('utf-8')
+        if self.latency:
+            time.sleep(self.latency)
+        if not self.fragment_size:
+            client.sendall(data)
+            return
+        for start in range(0, len(data), self.fragment_size):
+            client.sendall(data[start:start + self.fragment_size])
+            if self.latency:
+                time.sleep(self.latency)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulated MAX! Cube')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=62910)
+    parser.add_argument('--rooms', type=int, default=2)
+    parser.add_argument('--thermostats', type=int, default=2, help='per room')
+    parser.add_argument('--wall-thermostats', type=int, default=0, help='per room')
+    parser.add_argument('--window-shutters', type=int, default=0, help='per room')
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--fragment-size', type=int, default=None)
+    parser.add_argument('--disconnect-after', type=int, default=None)
+    args = parser.parse_args()
+
+    simulator = MaxCubeSimulator(rooms=args.rooms, thermostats=args.thermostats,
+                                 wall_thermostats=args.wall_thermostats,
+                                 window_shutters=args.window_shutters,
+                                 host=args.host, port=args.port, latency=args.latency,
+                                 fragment_size=args.fragment_size,
+                                 disconnect_after=args.disconnect_after)
+    simulator.start()
+    print(f"🧪 Simulated MAX! Cube with {len(simulator.devices)} devices in {len(simulator.rooms)} rooms "
+          f"listening on {simulator.host}:{simulator.port}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        simulator.stop()
+
+
+if __name__ == '__main__':
+    main()
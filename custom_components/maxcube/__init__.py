@@ -8,6 +8,7 @@ from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import Platform
 from homeassistant.core import HomeAssistant
 
+from .cache import MaxCubeMetadataCache
 from .const import DOMAIN
 from .coordinator import MaxCubeCoordinator
 # Services removed - were causing issues
@@ -21,7 +22,13 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Set up Jan eQ-3 MAX! from a config entry."""
     coordinator = MaxCubeCoordinator(hass, entry)
     
-    await coordinator.async_config_entry_first_refresh()
+    if await coordinator.async_restore_from_cache():
+        # Entities come up from the cached model, the cube is read in the background
+        hass.async_create_background_task(
+            coordinator.async_refresh(), f"{DOMAIN} first refresh"
+        )
+    else:
+        await coordinator.async_config_entry_first_refresh()
     
     hass.data.setdefault(DOMAIN, {})
     hass.data[DOMAIN][entry.entry_id] = coordinator
@@ -38,6 +45,12 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
     
     if unload_ok:
-        hass.data[DOMAIN].pop(entry.entry_id)
+        coordinator = hass.data[DOMAIN].pop(entry.entry_id)
+        await coordinator.async_shutdown()
     
     return unload_ok
+
+
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Remove the cached cube model along with the config entry."""
+    await MaxCubeMetadataCache(hass, entry.entry_id).async_remove()
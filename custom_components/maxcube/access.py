@@ -0,0 +1,129 @@
+"""Single-owner access to the MAX! Cube for Jan eQ-3 MAX! integration."""
+from __future__ import annotations
+
+import asyncio
+import itertools
+import logging
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from typing import Any
+
+from homeassistant.core import HomeAssistant
+
+_LOGGER = logging.getLogger(__name__)
+
+# Lower numbers run first
+PRIORITY_WRITE = 0
+PRIORITY_POLL = 1
+PRIORITY_RESCAN = 2
+
+
+@dataclass(order=True)
+class _Job:
+    """One piece of cube work waiting for its turn."""
+
+    priority: int
+    sequence: int
+    operation: Callable[[], Awaitable[Any]] = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    interruptible: bool = field(default=False, compare=False)
+    preempted: bool = field(default=False, compare=False)
+
+
+class MaxCubeAccess:
+    """Run all cube traffic one operation at a time, most urgent first.
+
+    The cube accepts a single TCP client, so polls, writes and rescans are
+    funnelled through one worker. Queued work is ordered by priority, and a
+    write arriving while an interruptible job (a full metadata dump) is
+    running cancels that job and re-queues it behind the write.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        """Initialize the access layer."""
+        self.hass = hass
+        self._queue: asyncio.PriorityQueue[_Job] = asyncio.PriorityQueue()
+        self._sequence = itertools.count()
+        self._worker: asyncio.Task | None = None
+        self._current: _Job | None = None
+        self._current_task: asyncio.Task | None = None
+
+    async def async_run(
+        self,
+        priority: int,
+        operation: Callable[[], Awaitable[Any]],
+        interruptible: bool = False,
+    ) -> Any:
+        """Queue operation and return its result once it has run."""
+        job = _Job(
+            priority,
+            next(self._sequence),
+            operation,
+            self.hass.loop.create_future(),
+            interruptible,
+        )
+        self._queue.put_nowait(job)
+
+        if self._worker is None or self._worker.done():
+            self._worker = self.hass.async_create_background_task(
+                self._async_work(), "jan_eq3_max cube access"
+            )
+
+        current = self._current
+        if (
+            current is not None
+            and current.interruptible
+            and priority < current.priority
+            and self._current_task is not None
+        ):
+            _LOGGER.debug("Interrupting cube job (priority %s) for priority %s", current.priority, priority)
+            current.preempted = True
+            self._current_task.cancel()
+
+        return await job.future
+
+    async def _async_work(self) -> None:
+        """Run queued jobs one at a time."""
+        while True:
+            job = await self._queue.get()
+            if job.future.done():
+                # The caller gave up waiting
+                continue
+
+            self._current = job
+            self._current_task = asyncio.ensure_future(job.operation())
+            try:
+                await asyncio.wait((self._current_task,))
+            except asyncio.CancelledError:
+                self._current_task.cancel()
+                job.future.cancel()
+                raise
+            finally:
+                task = self._current_task
+                self._current = None
+                self._current_task = None
+
+            if task.cancelled():
+                if job.preempted and not job.future.done():
+                    job.preempted = False
+                    self._queue.put_nowait(job)
+                else:
+                    job.future.cancel()
+            elif task.exception() is not None:
+                if not job.future.done():
+                    job.future.set_exception(task.exception())
+            elif not job.future.done():
+                job.future.set_result(task.result())
+
+    async def async_shutdown(self) -> None:
+        """Stop the worker and abandon queued work."""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+        while not self._queue.empty():
+            self._queue.get_nowait().future.cancel()
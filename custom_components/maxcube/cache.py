@@ -0,0 +1,121 @@
+"""Persistent metadata cache for Jan eQ-3 MAX! integration."""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+from typing import Any
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.storage import Store
+
+from .const import CACHE_SAVE_DELAY, DOMAIN
+from .cube import DEVICE_CLASSES, MaxCube
+from .room import MaxRoom
+from .snapshot import DEVICE_FIELDS, snapshot_device
+
+_LOGGER = logging.getLogger(__name__)
+
+STORAGE_VERSION = 1
+
+
+def metadata_fingerprint(cube: MaxCube) -> str:
+    """Return a hash of the rooms and devices the cube's M message described."""
+    metadata = [
+        [[room.id, room.name] for room in cube.rooms],
+        [
+            [device.type, device.rf_address, device.room_id, device.name, device.serial]
+            for device in cube.devices
+        ],
+    ]
+    return hashlib.sha1(json.dumps(metadata).encode("utf-8")).hexdigest()
+
+
+class MaxCubeMetadataCache:
+    """Keep the last parsed cube model in HA storage.
+
+    On restart the model is restored from here so entities can be created
+    before the cube answered. The stored copy is rewritten when the cube's rf
+    address or the metadata fingerprint changes, and with the latest readings
+    when the integration shuts down.
+    """
+
+    def __init__(self, hass: HomeAssistant, entry_id: str) -> None:
+        """Initialize the cache for one config entry."""
+        self._store: Store = Store(hass, STORAGE_VERSION, f"{DOMAIN}.{entry_id}")
+        self.cube_rf_address: str | None = None
+        self.fingerprint: str | None = None
+
+    async def async_restore(self, cube: MaxCube) -> bool:
+        """Fill cube with the cached rooms and devices, return False if there are none."""
+        try:
+            data = await self._store.async_load()
+        except Exception as err:  # pylint: disable=broad-except
+            _LOGGER.warning("Could not read the MAX! Cube cache: %s", err)
+            return False
+        if not data or not data.get("devices"):
+            return False
+
+        rooms = []
+        for cached_room in data["rooms"]:
+            room = MaxRoom()
+            room.id = cached_room["id"]
+            room.name = cached_room["name"]
+            rooms.append(room)
+
+        devices = []
+        for cached_device in data["devices"]:
+            device_class = DEVICE_CLASSES.get(cached_device.get("type"))
+            if device_class is None:
+                continue
+            device = device_class()
+            for field, value in cached_device.items():
+                if field in DEVICE_FIELDS and hasattr(device, field):
+                    setattr(device, field, value)
+            devices.append(device)
+
+        cube.rf_address = data.get("cube_rf_address")
+        cube.firmware_version = data.get("firmware_version")
+        cube.rooms[:] = rooms
+        cube.devices[:] = devices
+        cube.reindex()
+        # The live session still has to deliver the full dump
+        cube.metadata_stale = True
+
+        self.cube_rf_address = data.get("cube_rf_address")
+        self.fingerprint = data.get("fingerprint")
+        return True
+
+    def async_schedule_save(self, cube: MaxCube) -> None:
+        """Store the model soon if its metadata is not cached yet."""
+        if cube.rf_address is None:
+            return
+        fingerprint = metadata_fingerprint(cube)
+        if self.cube_rf_address == cube.rf_address and self.fingerprint == fingerprint:
+            return
+        self.cube_rf_address = cube.rf_address
+        self.fingerprint = fingerprint
+        _LOGGER.debug("Caching MAX! Cube metadata (fingerprint %s)", self.fingerprint)
+        self._store.async_delay_save(lambda: self._dump(cube), CACHE_SAVE_DELAY)
+
+    async def async_save(self, cube: MaxCube) -> None:
+        """Store the model with its latest readings now."""
+        if cube.rf_address is None or not cube.devices:
+            return
+        self.cube_rf_address = cube.rf_address
+        self.fingerprint = metadata_fingerprint(cube)
+        await self._store.async_save(self._dump(cube))
+
+    async def async_remove(self) -> None:
+        """Delete the stored copy."""
+        await self._store.async_remove()
+
+    def _dump(self, cube: MaxCube) -> dict[str, Any]:
+        """Return the model as JSON serializable data."""
+        return {
+            "cube_rf_address": cube.rf_address,
+            "firmware_version": cube.firmware_version,
+            "fingerprint": self.fingerprint,
+            "rooms": [{"id": room.id, "name": room.name} for room in cube.rooms],
+            "devices": [snapshot_device(device)._asdict() for device in cube.devices],
+        }
@@ -0,0 +1,197 @@
+import asyncio
+import collections
+import logging
+import os
+import queue
+import struct
+import threading
+import time
+
+from .parser import MaxCubeStreamParser
+
+logger = logging.getLogger(__name__)
+
+CAPTURE_MAGIC = b'MAXCAP1\n'
+
+# Record header: timestamp, direction, payload length
+RECORD_HEADER = struct.Struct('<dcI')
+
+DIRECTION_CONNECT = b'+'
+DIRECTION_SENT = b'>'
+DIRECTION_RECEIVED = b'<'
+DIRECTION_DISCONNECT = b'-'
+
+CaptureRecord = collections.namedtuple('CaptureRecord', ['timestamp', 'direction', 'data'])
+
+
+class MaxCubeCaptureWriter(object):
+    """Append every raw byte exchanged with the cube to a rotating capture file.
+
+    Each record is a small binary header (timestamp, direction, length)
+    followed by the bytes as they went over the wire. When the file grows
+    past max_bytes it is rotated to path.1, path.2, ... like logging's
+    RotatingFileHandler.
+
+    record() only queues the bytes. A writer thread does all file work, so
+    the writer can be handed to an AsyncMaxCubeConnection without blocking
+    the event loop. close() waits until everything queued is on disk.
+    """
+
+    def __init__(self, path, max_bytes=1024 * 1024, backup_count=3):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.file = None
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='maxcube-capture', daemon=True)
+        self._thread.start()
+
+    def _open(self):
+        self.file = open(self.path, 'ab')
+        if self.file.tell() == 0:
+            self.file.write(CAPTURE_MAGIC)
+
+    def record(self, direction, data=b''):
+        if self._thread is None or not self._thread.is_alive():
+            return
+        # Stamped now, written whenever the writer thread gets to it
+        self._queue.put((time.time(), direction, bytes(data)))
+
+    def _run(self):
+        try:
+            self._open()
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                self._write(*item)
+                if self._queue.empty():
+                    self.file.flush()
+        except (OSError, ValueError) as e:
+            logger.warning('Stopped capturing Max! Cube traffic to %s: %s' % (self.path, e))
+        finally:
+            if self.file:
+                self.file.close()
+            self.file = None
+
+    def _write(self, timestamp, direction, data):
+        if self.max_bytes and self.file.tell() + RECORD_HEADER.size + len(data) > self.max_bytes:
+            self.rotate()
+        self.file.write(RECORD_HEADER.pack(timestamp, direction, len(data)))
+        self.file.write(data)
+
+    def rotate(self):
+        self.file.close()
+        if self.backup_count > 0:
+            for index in range(self.backup_count - 1, 0, -1):
+                source = '%s.%d' % (self.path, index)
+                if os.path.exists(source):
+                    os.replace(source, '%s.%d' % (self.path, index + 1))
+            os.replace(self.path, self.path + '.1')
+        else:
+            os.remove(self.path)
+        self._open()
+
+    def close(self):
+        """Write out what is still queued and stop the writer thread."""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+
+def read_capture(path, include_rotated=False):
+    """Yield the CaptureRecords of a capture file, oldest rotated files first."""
+    paths = [path]
+    if include_rotated:
+        index = 1
+        while os.path.exists('%s.%d' % (path, index)):
+            paths.insert(0, '%s.%d' % (path, index))
+            index += 1
+
+    for capture_path in paths:
+        with open(capture_path, 'rb') as capture:
+            if capture.read(len(CAPTURE_MAGIC)) != CAPTURE_MAGIC:
+                raise ValueError('%s is not a Max! Cube capture' % capture_path)
+            while True:
+                header = capture.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    break
+                timestamp, direction, length = RECORD_HEADER.unpack(header)
+                yield CaptureRecord(timestamp, direction, capture.read(length))
+
+
+class MaxCubeReplayConnection(object):
+    """Connection that plays a captured session back instead of using a socket.
+
+    It offers both the MaxCubeConnection and AsyncMaxCubeConnection methods,
+    so a MaxCube can be driven by it either way. Received data is passed to
+    the listener chunk by chunk exactly as it was captured.
+    """
+
+    def __init__(self, path, persistent=True, include_rotated=False):
+        self.persistent = persistent
+        self.records = list(read_capture(path, include_rotated))
+        self.position = 0
+        self.connected = False
+        self.response = None
+        self.listener = None
+
+    def is_connected(self):
+        return self.connected
+
+    def connect(self):
+        self._seek(DIRECTION_CONNECT)
+        self.connected = True
+        self._replay_received()
+
+    def send(self, command):
+        if self.persistent and not self.connected:
+            self.connect()
+        record = self._seek(DIRECTION_SENT)
+        if record.data.decode('utf-8') != command:
+            logger.debug('Replay expected %r but got %r' % (record.data, command))
+        self._replay_received()
+
+    def disconnect(self):
+        if self.position < len(self.records) and self.records[self.position].direction == DIRECTION_DISCONNECT:
+            self.position += 1
+        self.connected = False
+
+    def close(self):
+        self.connected = False
+
+    async def async_connect(self):
+        self.connect()
+        await asyncio.sleep(0)
+
+    async def async_send(self, command):
+        self.send(command)
+        await asyncio.sleep(0)
+
+    async def async_disconnect(self):
+        self.disconnect()
+
+    def _seek(self, direction):
+        while self.position < len(self.records):
+            record = self.records[self.position]
+            self.position += 1
+            if record.direction == direction:
+                return record
+        raise ConnectionError('Capture has no more %s records' % direction.decode('utf-8'))
+
+    def _replay_received(self):
+        parser = MaxCubeStreamParser()
+        buffer = bytearray()
+        while self.position < len(self.records) and self.records[self.position].direction == DIRECTION_RECEIVED:
+            data = self.records[self.position].data
+            self.position += 1
+            buffer += data
+            for event in parser.feed(data):
+                if self.listener:
+                    self.listener(event)
+        for event in parser.flush():
+            if self.listener:
+                self.listener(event)
+        self.response = buffer.decode('utf-8')
@@ -0,0 +1,34 @@
+class MaxCubeChanges(object):
+    """Structural differences found when an M message was reconciled."""
+
+    FIELDS = ('rooms_added', 'rooms_removed', 'rooms_renamed',
+              'devices_added', 'devices_removed', 'devices_renamed', 'devices_moved')
+
+    def __init__(self):
+        self.rooms_added = []
+        self.rooms_removed = []
+        self.rooms_renamed = []
+        self.devices_added = []
+        self.devices_removed = []
+        self.devices_renamed = []
+        self.devices_moved = []
+
+    def has_changes(self):
+        return any(getattr(self, name) for name in self.FIELDS)
+
+    def update(self, other):
+        """Add the changes of a later M message that are not listed yet."""
+        for name in self.FIELDS:
+            listed = getattr(self, name)
+            for item in getattr(other, name):
+                if item not in listed:
+                    listed.append(item)
+
+    def __bool__(self):
+        return self.has_changes()
+
+    def __repr__(self):
+        return ('MaxCubeChanges(rooms +%d -%d ~%d, devices +%d -%d ~%d moved %d)'
+                % (len(self.rooms_added), len(self.rooms_removed), len(self.rooms_renamed),
+                   len(self.devices_added), len(self.devices_removed), len(self.devices_renamed),
+                   len(self.devices_moved)))
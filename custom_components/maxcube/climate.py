@@ -24,6 +24,7 @@ from .const import (
     THERMOSTAT_MODES,
 )
 from .coordinator import MaxCubeCoordinator
+from .entity import MaxCubeDeviceEntity
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -37,6 +38,15 @@ MAX_TO_HA_MODE = {
 
 HA_TO_MAX_MODE = {v: k for k, v in MAX_TO_HA_MODE.items()}
 
+# Device fields the climate entity shows
+CLIMATE_FIELDS = (
+    "actual_temperature",
+    "target_temperature",
+    "mode",
+    "min_temperature",
+    "max_temperature",
+)
+
 
 async def async_setup_entry(
     hass: HomeAssistant,
@@ -58,10 +68,9 @@ async def async_setup_entry(
         if cube.is_thermostat(device) or cube.is_wallthermostat(device):
             # For radiator valves, only create climate entity if room doesn't have wall thermostat
             if cube.is_thermostat(device):
-                room = cube.room_by_id(device.room_id)
                 has_wall_thermostat = any(
-                    cube.is_wallthermostat(d) and d.room_id is not None and device.room_id is not None and d.room_id == device.room_id
-                    for d in cube.devices
+                    cube.is_wallthermostat(d)
+                    for d in cube.devices_by_room_id(device.room_id)
                 )
                 if has_wall_thermostat:
                     continue  # Skip radiator valve if room has wall thermostat
@@ -71,17 +80,17 @@ async def async_setup_entry(
     async_add_entities(entities)
 
 
-class MaxCubeClimate(ClimateEntity):
+class MaxCubeClimate(MaxCubeDeviceEntity, ClimateEntity):
     """Representation of a MAX! thermostat."""
 
     _attr_temperature_unit = UnitOfTemperature.CELSIUS
     _attr_hvac_modes = [HVACMode.AUTO, HVACMode.HEAT, HVACMode.OFF]
     _attr_supported_features = ClimateEntityFeature.TARGET_TEMPERATURE
+    _device_fields = CLIMATE_FIELDS
 
     def __init__(self, coordinator: MaxCubeCoordinator, device, create_mode_devices: bool) -> None:
         """Initialize the climate entity."""
-        self.coordinator = coordinator
-        self.device = device
+        super().__init__(coordinator, device)
         self.create_mode_devices = create_mode_devices
         
         # Set unique ID based on device RF address
@@ -94,40 +103,42 @@ class MaxCubeClimate(ClimateEntity):
     @property
     def current_temperature(self) -> float | None:
         """Return the current temperature."""
-        return self.device.actual_temperature
+        state = self._state
+        return state.actual_temperature if state else None
 
     @property
     def target_temperature(self) -> float | None:
         """Return the target temperature."""
-        return self.device.target_temperature
+        state = self._state
+        return state.target_temperature if state else None
 
     @property
     def hvac_mode(self) -> HVACMode:
         """Return current HVAC mode."""
-        return MAX_TO_HA_MODE.get(self.device.mode, HVACMode.AUTO)
+        state = self._state
+        return MAX_TO_HA_MODE.get(state.mode if state else None, HVACMode.AUTO)
 
     @property
     def min_temp(self) -> float:
         """Return minimum temperature."""
-        return self.device.min_temperature or 5.0
+        state = self._state
+        return (state.min_temperature if state else None) or 5.0
 
     @property
     def max_temp(self) -> float:
         """Return maximum temperature."""
-        return self.device.max_temperature or 30.0
-
-    @property
-    def available(self) -> bool:
-        """Return if entity is available."""
-        return self.coordinator.last_update_success
+        state = self._state
+        return (state.max_temperature if state else None) or 30.0
 
     async def async_set_temperature(self, **kwargs: Any) -> None:
         """Set new target temperature."""
         if (temperature := kwargs.get(ATTR_TEMPERATURE)) is None:
             return
         
-        await self.coordinator.set_target_temperature(self.device.rf_address, temperature)
-        await self.coordinator.async_request_refresh()
+        # The coordinator pushes the new state once the cube accepted it
+        await self.coordinator.set_target_temperature(
+            self.device.rf_address, temperature, self._is_background_request()
+        )
 
     async def async_set_hvac_mode(self, hvac_mode: HVACMode) -> None:
         """Set new target HVAC mode."""
@@ -137,9 +148,11 @@ class MaxCubeClimate(ClimateEntity):
         
         max_mode = HA_TO_MAX_MODE.get(hvac_mode)
         if max_mode is not None:
-            await self.coordinator.set_mode(self.device.rf_address, max_mode)
-            await self.coordinator.async_request_refresh()
-
-    async def async_update(self) -> None:
-        """Update the entity."""
-        await self.coordinator.async_request_refresh()
+            await self.coordinator.set_mode(
+                self.device.rf_address, max_mode, self._is_background_request()
+            )
+
+    def _is_background_request(self) -> bool:
+        """Return True when the current call was not made by a user (e.g. an automation)."""
+        context = self._context
+        return context is None or context.user_id is None
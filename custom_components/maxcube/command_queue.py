@@ -0,0 +1,162 @@
+"""Command queue for Jan eQ-3 MAX! integration."""
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.exceptions import HomeAssistantError
+
+from .const import COMMAND_DEBOUNCE_MAX_WAIT, COMMAND_MAX_DEFER
+from .scheduler import DutyCycleScheduler
+
+_LOGGER = logging.getLogger(__name__)
+
+SendCallback = Callable[[str, "float | None", "int | None"], Awaitable[None]]
+
+
+@dataclass
+class PendingCommand:
+    """Latest requested temperature and mode for one device."""
+
+    rf_address: str
+    temperature: float | None = None
+    mode: int | None = None
+    low_priority: bool = True
+    waiters: list[asyncio.Future] = field(default_factory=list)
+
+
+class MaxCubeCommandQueue:
+    """Debounce thermostat writes and coalesce them per device.
+
+    Requests for the same rf address that arrive before the queue is flushed
+    are merged, the latest temperature and mode win. Devices are flushed in
+    the order they were first queued, one command at a time, as fast as the
+    duty cycle scheduler allows. Ready commands are not held up by low
+    priority ones that have to wait. Every write restarts the debounce
+    delay, but the queue is flushed no later than max_wait after the first
+    write, so a steady stream of writes cannot hold back the others.
+    Commands the scheduler would hold back for longer than max_defer fail
+    with HomeAssistantError instead of keeping their caller waiting.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        send: SendCallback,
+        delay: float,
+        scheduler: DutyCycleScheduler,
+        max_wait: float = COMMAND_DEBOUNCE_MAX_WAIT,
+        max_defer: float = COMMAND_MAX_DEFER,
+    ) -> None:
+        """Initialize the command queue."""
+        self.hass = hass
+        self._send = send
+        self._delay = delay
+        self._max_wait = max_wait
+        self._max_defer = max_defer
+        self._scheduler = scheduler
+        self._pending: dict[str, PendingCommand] = {}
+        self._timer: asyncio.TimerHandle | None = None
+        # Loop time by which the debounced writes are flushed at the latest
+        self._deadline: float | None = None
+        self._flush_lock = asyncio.Lock()
+
+    async def async_enqueue(
+        self,
+        rf_address: str,
+        temperature: float | None = None,
+        mode: int | None = None,
+        low_priority: bool = False,
+    ) -> None:
+        """Queue a write and wait until the merged command has been sent."""
+        command = self._pending.get(rf_address)
+        if command is None:
+            command = self._pending[rf_address] = PendingCommand(rf_address)
+        if temperature is not None:
+            command.temperature = temperature
+        if mode is not None:
+            command.mode = mode
+        command.low_priority = command.low_priority and low_priority
+
+        waiter = self.hass.loop.create_future()
+        command.waiters.append(waiter)
+        self._schedule_flush()
+        await waiter
+
+    @callback
+    def _schedule_flush(self) -> None:
+        """(Re)start the debounce timer, without moving past the deadline."""
+        now = self.hass.loop.time()
+        if self._deadline is None:
+            self._deadline = now + self._max_wait
+        if self._timer is not None:
+            self._timer.cancel()
+        delay = max(0.0, min(self._delay, self._deadline - now))
+        self._timer = self.hass.loop.call_later(delay, self._start_flush)
+
+    @callback
+    def _start_flush(self) -> None:
+        """Flush the queue once the debounce delay has passed."""
+        self._timer = None
+        self._deadline = None
+        self.hass.async_create_task(self.async_flush())
+
+    async def async_flush(self, force: bool = False) -> None:
+        """Send all pending commands in order, without pacing if forced."""
+        async with self._flush_lock:
+            while self._pending:
+                command, wait = self._next_command(force)
+                if command is None:
+                    await asyncio.sleep(wait)
+                    continue
+
+                del self._pending[command.rf_address]
+                self._scheduler.consume()
+                try:
+                    await self._send(command.rf_address, command.temperature, command.mode)
+                except Exception as err:  # pylint: disable=broad-except
+                    for waiter in command.waiters:
+                        if not waiter.done():
+                            waiter.set_exception(err)
+                else:
+                    for waiter in command.waiters:
+                        if not waiter.done():
+                            waiter.set_result(None)
+
+    def _next_command(self, force: bool) -> tuple[PendingCommand | None, float]:
+        """Return the first command that may be sent now, or how long to wait."""
+        shortest_wait = None
+        for command in list(self._pending.values()):
+            wait = 0.0 if force else self._scheduler.delay(command.low_priority)
+            if wait <= 0:
+                return command, 0.0
+            if wait > self._max_defer:
+                self._reject(command, wait)
+                continue
+            if shortest_wait is None or wait < shortest_wait:
+                shortest_wait = wait
+        return None, shortest_wait or 0.0
+
+    def _reject(self, command: PendingCommand, wait: float) -> None:
+        """Fail a command that would have to wait too long for the cube."""
+        del self._pending[command.rf_address]
+        err = HomeAssistantError(
+            f"MAX! Cube is short on airtime (duty cycle {self._scheduler.duty_cycle}%, "
+            f"{self._scheduler.free_memory_slots} free slots), command for "
+            f"{command.rf_address} not sent, try again in {wait:.0f} s"
+        )
+        _LOGGER.warning("%s", err)
+        for waiter in command.waiters:
+            if not waiter.done():
+                waiter.set_exception(err)
+
+    async def async_shutdown(self) -> None:
+        """Send whatever is still pending without waiting for the delay."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._deadline = None
+        await self.async_flush(force=True)
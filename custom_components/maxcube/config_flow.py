@@ -25,7 +25,10 @@ STEP_USER_DATA_SCHEMA = vol.Schema(
             vol.Coerce(int), vol.Range(min=1, max=100)
         ),
         vol.Required("update_interval", default=300): vol.In([60, 120, 300, 600, 1800]),
+        vol.Required("adaptive_polling", default=False): bool,
+        vol.Required("stale_budget", default=900): vol.In([300, 900, 1800, 3600]),
         vol.Required("debug_mode", default=False): bool,
+        vol.Required("capture_traffic", default=False): bool,
     }
 )
 
@@ -1,15 +1,81 @@
+import asyncio
 import socket
 import logging
+import time
+
+from .capture import DIRECTION_CONNECT, DIRECTION_DISCONNECT, DIRECTION_RECEIVED, DIRECTION_SENT
+from .parser import MaxCubeStreamParser
+from .telemetry import \
+    METRIC_BYTES_RECEIVED, \
+    METRIC_CONNECT_TIME, \
+    METRIC_PARSE_TIME, \
+    METRIC_READ_TIME, \
+    METRIC_RECONNECTS, \
+    SIZE_BUCKETS
 
 logger = logging.getLogger(__name__)
 
+# The cube ends its greeting (H, M, C..., L) with the live status message
+GREETING_TERMINATOR = 'L:'
+
+# Message that completes the cube's reply to a command, None if it sends none
+REPLY_TERMINATORS = {
+    'l:': 'L:',
+    's:': 'S:',
+    'q:': None,
+}
+
+
+def dispatch_events(parser, data, terminator, listener, telemetry=None):
+    """Feed data to parser, pass its events on and tell if the reply is complete."""
+    complete = False
+    for event in parser.feed(data):
+        notify_listener(listener, event, telemetry)
+        if terminator and event.message.startswith(terminator):
+            complete = True
+    return complete
+
+
+def notify_listener(listener, event, telemetry=None):
+    """Pass event to listener, timing how long it takes to handle per message type."""
+    if not listener:
+        return
+    if telemetry is None:
+        listener(event)
+        return
+    with telemetry.timer(METRIC_PARSE_TIME, event.type):
+        listener(event)
+
+
+def record_read(telemetry, started, received):
+    if telemetry is not None:
+        telemetry.observe(METRIC_READ_TIME, time.perf_counter() - started)
+        telemetry.observe(METRIC_BYTES_RECEIVED, received, buckets=SIZE_BUCKETS)
+
 
 class MaxCubeConnection(object):
-    def __init__(self, host, port):
+    def __init__(self, host, port, persistent=False, capture=None, telemetry=None):
         self.host = host
         self.port = port
+        # In persistent mode the socket is kept open between operations and
+        # re-established transparently when the cube drops it.
+        self.persistent = persistent
         self.socket = None
         self.response = None
+        self.closed_by_peer = False
+        # Called with every MaxCubeEvent as soon as its line has arrived
+        self.listener = None
+        # Optional MaxCubeCaptureWriter that records all raw traffic
+        self.capture = capture
+        # Optional MaxCubeTelemetry that records timings and sizes
+        self.telemetry = telemetry
+
+    def is_connected(self):
+        return self.socket is not None
+
+    def record(self, direction, data=b''):
+        if self.capture:
+            self.capture.record(direction, data)
 
     def connect(self):
         logger.debug('Connecting to Max! Cube at ' + self.host + ':' + str(self.port))
@@ -21,29 +87,240 @@ class MaxCubeConnection(object):
 
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.socket.settimeout(2)
+        started = time.perf_counter()
         self.socket.connect((self.host, self.port))
-        self.read()
+        if self.telemetry is not None:
+            self.telemetry.observe(METRIC_CONNECT_TIME, time.perf_counter() - started)
+        self.record(DIRECTION_CONNECT)
+        self.read(GREETING_TERMINATOR)
 
-    def read(self):
+    def read(self, terminator=None):
+        """Read until a complete line starting with terminator has arrived.
+
+        Without a terminator this reads until the cube closes the connection.
+        The socket timeout is only a safety net for replies that never end.
+        """
         buffer_size = 4096
         buffer = bytearray([])
-        more = True
+        parser = MaxCubeStreamParser()
+        self.closed_by_peer = False
+        started = time.perf_counter()
 
-        while more:
-            try:
-                tmp = self.socket.recv(buffer_size)
-                more = len(tmp) > 0
+        try:
+            while True:
+                try:
+                    tmp = self.socket.recv(buffer_size)
+                except socket.timeout:
+                    if terminator:
+                        logger.debug('Timed out waiting for %s from Max! Cube' % terminator)
+                        # The rest of the reply may still arrive and would be
+                        # mistaken for the answer to the next command.
+                        if self.persistent:
+                            self.close()
+                    break
+                if not tmp:
+                    self.closed_by_peer = True
+                    break
                 buffer += tmp
-            except socket.timeout:
-                break
+                self.record(DIRECTION_RECEIVED, tmp)
+                if dispatch_events(parser, tmp, terminator, self.listener, self.telemetry):
+                    break
+            # A last line cut off by a timeout or a closed socket is still passed on
+            for event in parser.flush():
+                notify_listener(self.listener, event, self.telemetry)
+        except Exception:
+            # The rest of the reply is still unread and would be mistaken
+            # for the answer to the next command.
+            self.close()
+            raise
+        record_read(self.telemetry, started, len(buffer))
         self.response = buffer.decode('utf-8')
 
+    @classmethod
+    def reply_terminator(cls, command):
+        return REPLY_TERMINATORS.get(command[:2].lower(), None)
+
     def send(self, command):
-        self.socket.send(command.encode('utf-8'))
-        self.read()
+        if not self.persistent:
+            self.socket.send(command.encode('utf-8'))
+            self.record(DIRECTION_SENT, command.encode('utf-8'))
+            self.read(self.reply_terminator(command))
+            return
+
+        greeting = ''
+        if self.socket is None:
+            self.connect()
+            greeting = self.response
+
+        try:
+            self._exchange(command)
+        except socket.error as e:
+            logger.debug('Lost session with Max! Cube (%s), reconnecting' % e)
+            if self.telemetry is not None:
+                self.telemetry.increment(METRIC_RECONNECTS)
+            self.close()
+            self.connect()
+            greeting = self.response
+            self._exchange(command)
+
+        self.response = greeting + self.response
+
+    def _exchange(self, command):
+        self.socket.sendall(command.encode('utf-8'))
+        self.record(DIRECTION_SENT, command.encode('utf-8'))
+        self.read(self.reply_terminator(command))
+        if self.closed_by_peer and not self.response:
+            raise ConnectionResetError('Max! Cube closed the connection')
 
     def disconnect(self):
         if self.socket:
-            self.send('q:\r\n')
+            try:
+                # The cube does not answer q:, so there is nothing to wait for
+                self.socket.send('q:\r\n'.encode('utf-8'))
+            except socket.error:
+                logger.debug('Could not send quit to Max! Cube, closing anyway.')
             self.socket.close()
+            self.record(DIRECTION_DISCONNECT)
         self.socket = None
+
+    def close(self):
+        if self.socket:
+            try:
+                self.socket.close()
+            except socket.error:
+                pass
+            self.record(DIRECTION_DISCONNECT)
+        self.socket = None
+
+
+class AsyncMaxCubeConnection(object):
+    """asyncio counterpart of MaxCubeConnection for use inside an event loop.
+
+    Every operation (connect, a command and its reply) has to complete within
+    `timeout` seconds, so a silent cube can never stall the caller.
+    """
+
+    def __init__(self, host, port, persistent=False, timeout=2, capture=None, telemetry=None):
+        self.host = host
+        self.port = port
+        self.persistent = persistent
+        self.timeout = timeout
+        self.reader = None
+        self.writer = None
+        self.response = None
+        self.closed_by_peer = False
+        self.listener = None
+        self.capture = capture
+        self.telemetry = telemetry
+
+    def is_connected(self):
+        return self.writer is not None
+
+    def record(self, direction, data=b''):
+        if self.capture:
+            self.capture.record(direction, data)
+
+    async def async_connect(self):
+        logger.debug('Connecting to Max! Cube at ' + self.host + ':' + str(self.port))
+        if self.writer:
+            await self.async_disconnect()
+
+        started = time.perf_counter()
+        self.reader, self.writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), self.timeout)
+        if self.telemetry is not None:
+            self.telemetry.observe(METRIC_CONNECT_TIME, time.perf_counter() - started)
+        self.record(DIRECTION_CONNECT)
+        # A cancelled greeting read closes the session itself
+        await self.async_read(GREETING_TERMINATOR)
+
+    async def async_read(self, terminator=None):
+        buffer_size = 4096
+        buffer = bytearray([])
+        parser = MaxCubeStreamParser()
+        self.closed_by_peer = False
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        started = time.perf_counter()
+
+        try:
+            while True:
+                try:
+                    tmp = await asyncio.wait_for(self.reader.read(buffer_size), deadline - loop.time())
+                except asyncio.TimeoutError:
+                    if terminator:
+                        logger.debug('Timed out waiting for %s from Max! Cube' % terminator)
+                        # The rest of the reply may still arrive and would be
+                        # mistaken for the answer to the next command.
+                        if self.persistent:
+                            self.close()
+                    break
+                if not tmp:
+                    self.closed_by_peer = True
+                    break
+                buffer += tmp
+                self.record(DIRECTION_RECEIVED, tmp)
+                if dispatch_events(parser, tmp, terminator, self.listener, self.telemetry):
+                    break
+            for event in parser.flush():
+                notify_listener(self.listener, event, self.telemetry)
+        except (Exception, asyncio.CancelledError):
+            # Interrupted or failed half way through a reply, the session
+            # cannot be reused without mixing up replies.
+            self.close()
+            raise
+        record_read(self.telemetry, started, len(buffer))
+        self.response = buffer.decode('utf-8')
+
+    async def async_send(self, command):
+        if not self.persistent:
+            await self._async_exchange(command)
+            return
+
+        greeting = ''
+        if self.writer is None:
+            await self.async_connect()
+            greeting = self.response
+
+        try:
+            await self._async_exchange(command)
+        except (OSError, asyncio.IncompleteReadError) as e:
+            logger.debug('Lost session with Max! Cube (%s), reconnecting' % e)
+            if self.telemetry is not None:
+                self.telemetry.increment(METRIC_RECONNECTS)
+            self.close()
+            await self.async_connect()
+            greeting = self.response
+            await self._async_exchange(command)
+
+        self.response = greeting + self.response
+
+    async def _async_exchange(self, command):
+        self.writer.write(command.encode('utf-8'))
+        self.record(DIRECTION_SENT, command.encode('utf-8'))
+        try:
+            await asyncio.wait_for(self.writer.drain(), self.timeout)
+        except asyncio.CancelledError:
+            # The command may already be on its way, its reply would be
+            # read as the answer to the next one.
+            self.close()
+            raise
+        await self.async_read(MaxCubeConnection.reply_terminator(command))
+        if self.persistent and self.closed_by_peer and not self.response:
+            raise ConnectionResetError('Max! Cube closed the connection')
+
+    async def async_disconnect(self):
+        if self.writer:
+            try:
+                self.writer.write('q:\r\n'.encode('utf-8'))
+                await asyncio.wait_for(self.writer.drain(), self.timeout)
+            except (OSError, asyncio.TimeoutError):
+                logger.debug('Could not send quit to Max! Cube, closing anyway.')
+        self.close()
+
+    def close(self):
+        if self.writer:
+            self.writer.close()
+            self.record(DIRECTION_DISCONNECT)
+        self.reader = None
+        self.writer = None
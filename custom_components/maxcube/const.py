@@ -10,6 +10,9 @@ CONF_THERMOSTAT_MODES = "thermostat_modes"
 CONF_HEAT_DEMAND_SWITCH = "heat_demand_switch"
 CONF_MIN_VALVE_POSITION = "min_valve_position"
 CONF_UPDATE_INTERVAL = "update_interval"
+CONF_ADAPTIVE_POLLING = "adaptive_polling"
+CONF_STALE_BUDGET = "stale_budget"
+CONF_CAPTURE_TRAFFIC = "capture_traffic"
 CONF_DEBUG_MODE = "debug_mode"
 
 # Default values
@@ -19,8 +22,59 @@ DEFAULT_THERMOSTAT_MODES = False
 DEFAULT_HEAT_DEMAND_SWITCH = False
 DEFAULT_MIN_VALVE_POSITION = 25
 DEFAULT_UPDATE_INTERVAL = 300  # 5 minutes
+DEFAULT_ADAPTIVE_POLLING = False
+DEFAULT_STALE_BUDGET = 900  # 15 minutes
+DEFAULT_CAPTURE_TRAFFIC = False
 DEFAULT_DEBUG_MODE = False
 
+# Seconds to wait for more thermostat writes before sending them to the cube
+COMMAND_DEBOUNCE_DELAY = 0.5
+# Longest a write waits while more writes keep arriving, for any device
+COMMAND_DEBOUNCE_MAX_WAIT = 2.0
+
+# Command pacing: burst size and sustained commands per second
+COMMAND_BURST = 5
+COMMAND_RATE = 0.2
+
+# Reported duty cycle (% of the 1% airtime budget) above which low priority
+# commands are held back, and for how many seconds after that reading. The
+# next command sent after that brings a new reading.
+DUTY_CYCLE_HIGH = 80
+DUTY_CYCLE_LOW_PRIORITY_DEFER = 30
+
+# Longest a queued command is held back for pacing. A command that would
+# have to wait longer is rejected so the caller learns the cube is busy.
+# Never shorter than the deferral above, or deferring would mean rejecting.
+COMMAND_MAX_DEFER = DUTY_CYCLE_LOW_PRIORITY_DEFER
+
+# Seconds an accepted write is shown even while polls still report the old
+# value, the thermostat may not have received it over the air yet
+COMMAND_CONFIRM_GRACE = 120
+
+# Seconds after an accepted write until a poll checks that the thermostat
+# got it, well inside the grace window whatever the update interval
+COMMAND_CONFIRM_DELAY = 30
+
+# Adaptive polling: seconds between polls while something is happening, and
+# how much the interval grows with every quiet poll up to update_interval
+ADAPTIVE_POLL_MIN_INTERVAL = 15
+ADAPTIVE_POLL_BACKOFF = 2
+
+# Failed polls: first retry delay and its cap in seconds, and the random
+# share added to or taken from each delay
+RETRY_BACKOFF_MIN = 15
+RETRY_BACKOFF_MAX = 600
+RETRY_JITTER = 0.2
+
+# Failed polls in a row after which the cube is left alone, and for how many
+# seconds before a single trial poll. The cooldown is shortened when the
+# stale budget would otherwise run out before the trial poll.
+CIRCUIT_BREAKER_THRESHOLD = 5
+CIRCUIT_BREAKER_COOLDOWN = 900
+
+# Seconds to collect metadata changes before the cache is written to disk
+CACHE_SAVE_DELAY = 10
+
 # Update intervals in seconds
 UPDATE_INTERVALS = {
     60: "1 minute",
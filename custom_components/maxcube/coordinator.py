@@ -1,16 +1,47 @@
 """Data coordinator for Jan eQ-3 MAX! integration."""
 from __future__ import annotations
 
+import asyncio
 import logging
+import time
+from collections.abc import Callable
 from datetime import timedelta
 
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.exceptions import HomeAssistantError
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
 
-from .const import DOMAIN
+from .access import MaxCubeAccess, PRIORITY_POLL, PRIORITY_RESCAN, PRIORITY_WRITE
+from .cache import MaxCubeMetadataCache
+from .capture import MaxCubeCaptureWriter
+from .command_queue import MaxCubeCommandQueue
+from .const import (
+    COMMAND_CONFIRM_DELAY,
+    COMMAND_CONFIRM_GRACE,
+    COMMAND_DEBOUNCE_DELAY,
+    CONF_ADAPTIVE_POLLING,
+    CONF_CAPTURE_TRAFFIC,
+    CONF_STALE_BUDGET,
+    DEFAULT_ADAPTIVE_POLLING,
+    DEFAULT_CAPTURE_TRAFFIC,
+    DEFAULT_STALE_BUDGET,
+    DOMAIN,
+)
 from .cube import MaxCube
-from .connection import MaxCubeConnection
+from .device import MAX_THERMOSTAT, MAX_THERMOSTAT_PLUS
+from .connection import AsyncMaxCubeConnection
+from .polling import AdaptivePollInterval, PollRetryPolicy
+from .scheduler import DutyCycleScheduler
+from .snapshot import MaxCubeSnapshot
+from .telemetry import (
+    METRIC_COMMAND_FAILURES,
+    METRIC_COMMAND_TIME,
+    METRIC_POLL_FAILURES,
+    METRIC_POLL_TIME,
+    METRIC_POLLS_SKIPPED,
+    MaxCubeTelemetry,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -30,6 +61,50 @@ class MaxCubeCoordinator(DataUpdateCoordinator):
             logging.getLogger("maxcube").setLevel(logging.DEBUG)
         
         update_interval = timedelta(seconds=entry.data.get("update_interval", 300))
+        self._base_update_interval = update_interval
+
+        # In adaptive mode update_interval is the slowest the cube is polled
+        self._poll_interval: AdaptivePollInterval | None = None
+        if entry.data.get(CONF_ADAPTIVE_POLLING, DEFAULT_ADAPTIVE_POLLING):
+            self._poll_interval = AdaptivePollInterval(update_interval.total_seconds())
+        
+        # Timings, sizes and failures of cube traffic, for diagnostics
+        self.telemetry = MaxCubeTelemetry()
+
+        # Raw traffic recorded for offline replay, written from its own thread
+        self._capture: MaxCubeCaptureWriter | None = None
+        if entry.data.get(CONF_CAPTURE_TRAFFIC, DEFAULT_CAPTURE_TRAFFIC):
+            capture_path = hass.config.path(f"{DOMAIN}_{entry.entry_id}.cap")
+            _LOGGER.info("Capturing MAX! Cube traffic to %s", capture_path)
+            self._capture = MaxCubeCaptureWriter(capture_path)
+
+        # One long-lived session to the cube, shared by polls and commands.
+        # It is asyncio based so cube traffic never blocks the event loop.
+        self._connection = AsyncMaxCubeConnection(
+            self.cube_address,
+            self.cube_port,
+            persistent=True,
+            capture=self._capture,
+            telemetry=self.telemetry,
+        )
+        
+        # The cube model lives as long as the coordinator and is updated in
+        # place, so entities can keep references to its device objects.
+        self.cube = MaxCube(self._connection, auto_init=False)
+        self._cube_initialized = False
+
+        # Rooms and devices from the last run, so setup need not wait for the cube
+        self._cache = MaxCubeMetadataCache(hass, entry.entry_id)
+        self._restored_from_cache = False
+        # Set when a poll parsed metadata the cache may not hold yet
+        self._metadata_unsaved = False
+
+        # Failed polls are answered with the last good data for up to
+        # stale_budget seconds, and retried with backoff in the meantime
+        self._stale_budget = entry.data.get(CONF_STALE_BUDGET, DEFAULT_STALE_BUDGET)
+        self._retry = PollRetryPolicy.within_budget(self._stale_budget)
+        self._last_success: float | None = None
+        self._stale_since: float | None = None
         
         super().__init__(
             hass,
@@ -37,95 +112,421 @@ class MaxCubeCoordinator(DataUpdateCoordinator):
             name=DOMAIN,
             update_interval=update_interval,
         )
+        
+        # Polls, writes and rescans take turns on the single cube session
+        self._access = MaxCubeAccess(hass)
+        
+        # Bursts of writes (e.g. dragging a slider) become one command per
+        # device, paced by the duty cycle the cube reports
+        self.scheduler = DutyCycleScheduler()
+        self._command_queue = MaxCubeCommandQueue(
+            hass, self._async_send_command, COMMAND_DEBOUNCE_DELAY, self.scheduler
+        )
+
+        # Entities that only want to hear about changes to their own device
+        self._device_listeners: dict[str, list[tuple[Callable[[], None], frozenset[str] | None]]] = {}
+        self._notified_changes = None
+        self._notified_success: bool | None = None
+        self._notified_stale: bool | None = None
+
+        # Accepted writes the cube has not reported back yet:
+        # rf address -> (target temperature, mode, grace deadline)
+        self._optimistic: dict[str, tuple[float, int, float]] = {}
+        self._confirm_timer: asyncio.TimerHandle | None = None
 
     async def _async_update_data(self) -> dict:
         """Update data via library."""
+        if not self._retry.allow_request():
+            # The cube kept failing, leave it alone until the cooldown is over
+            self.telemetry.increment(METRIC_POLLS_SKIPPED)
+            self.update_interval = timedelta(seconds=self._retry.remaining_cooldown())
+            return self._stale_data(
+                f"MAX! Cube not polled after {self._retry.failures} failed polls"
+            )
+
         try:
-            # Create cube connection
-            connection = MaxCubeConnection(self.cube_address, self.cube_port)
-            cube = MaxCube(connection)
-            
-            # Update cube data
-            cube.update()
-            
-            # Prepare data for platforms
-            data = {
-                "cube": cube,
-                "devices": cube.devices,
-                "rooms": cube.rooms,
-                "heat_demand": self._calculate_heat_demand(cube),
-            }
-            
+            # A poll that needs the full dump may be interrupted by a write,
+            # a live status poll is short enough to let it finish.
+            snapshot = await self._access.async_run(
+                PRIORITY_POLL,
+                self._async_poll_cube,
+                interruptible=not self.cube.can_poll_live_status(),
+            )
+
+            self._retry.record_success()
+            self._last_success = time.monotonic()
+            self._stale_since = None
+
+            data = self._build_data(snapshot)
+            self._adapt_update_interval(data)
+            if self._metadata_unsaved:
+                # Fingerprinting walks all rooms and devices, not on every poll
+                self._metadata_unsaved = False
+                self._cache.async_schedule_save(self.cube)
+
             if self.debug_mode:
-                _LOGGER.debug("Updated MAX! Cube data: %s devices, %s rooms", 
-                             len(cube.devices), len(cube.rooms))
-            
+                _LOGGER.debug("Updated MAX! Cube data: %s devices, %s rooms",
+                             len(self.cube.devices), len(self.cube.rooms))
+
             return data
-            
+
         except Exception as err:
-            raise UpdateFailed(f"Error communicating with MAX! Cube: {err}")
+            self.telemetry.increment(METRIC_POLL_FAILURES)
+            retry_delay = self._retry.record_failure()
+            self.update_interval = timedelta(seconds=retry_delay)
+            return self._stale_data(f"Error communicating with MAX! Cube: {err}")
+
+    def _update_scheduler(self) -> None:
+        """Pass the cube's duty cycle reading on to the command scheduler."""
+        self.scheduler.update(
+            self.cube.duty_cycle,
+            self.cube.free_memory_slots,
+            self.cube.duty_cycle_reading,
+        )
+
+    def _stale_data(self, message: str) -> dict:
+        """Return the last good data marked stale, or raise once it is older than the budget."""
+        now = time.monotonic()
+        if self._stale_since is None:
+            self._stale_since = now
+        if not self.data or now - self._stale_since > self._stale_budget:
+            raise UpdateFailed(message)
+
+        # Warn when the data goes stale, not on every retry after that
+        log = _LOGGER.debug if self.data["stale"] else _LOGGER.warning
+        log("%s, showing the last known state", message)
+        return {**self.data, "stale": True}
+
+    @property
+    def data_age(self) -> float | None:
+        """Return the seconds since the cube last answered a poll, None before the first."""
+        if self._last_success is None:
+            return None
+        return time.monotonic() - self._last_success
+
+    async def _async_poll_cube(self) -> MaxCubeSnapshot:
+        """Fetch the live status, or the full dump on the first poll, and snapshot it."""
+        started = time.perf_counter()
+        if self._cube_initialized:
+            await self.cube.async_update()
+            if self.cube.metadata_changes:
+                self._metadata_unsaved = True
+            self._handle_metadata_changes()
+        else:
+            await self.cube.async_init()
+            self._cube_initialized = True
+            self._metadata_unsaved = True
+            if self._restored_from_cache:
+                # Entities were created from the cache, the dump may disagree
+                self._restored_from_cache = False
+                self._handle_metadata_changes()
+            else:
+                # Entities are set up from this first dump, nothing to reload
+                self.cube.pop_metadata_changes()
+        self._reconcile_optimistic()
+        # l: replies carry no duty cycle, only a new H: or S: counts
+        self._update_scheduler()
+        self.telemetry.observe(METRIC_POLL_TIME, time.perf_counter() - started)
+        # Still inside the access job, the next job may already stream into
+        # the model once it returns
+        return self._take_snapshot()
+
+    async def async_restore_from_cache(self) -> bool:
+        """Publish the cached model as stale data, return False if there is none."""
+        if not await self._cache.async_restore(self.cube):
+            return False
+        self._restored_from_cache = True
+        self._stale_since = time.monotonic()
+        self.data = self._build_data(self._take_snapshot())
+        self.async_update_listeners()
+        _LOGGER.info("Restored %s MAX! devices from cache, refreshing from the cube in the background",
+                     len(self.cube.devices))
+        return True
+
+    def _reconcile_optimistic(self) -> None:
+        """Hold accepted writes over stale polls, roll back once the grace window is over."""
+        now = time.monotonic()
+        for rf_address, (temperature, mode, deadline) in list(self._optimistic.items()):
+            device = self.cube.device_by_rf(rf_address)
+            if device is None:
+                del self._optimistic[rf_address]
+            elif device.target_temperature == temperature and device.mode == mode:
+                del self._optimistic[rf_address]
+            elif now < deadline:
+                device.target_temperature = temperature
+                device.mode = mode
+            else:
+                del self._optimistic[rf_address]
+                _LOGGER.warning(
+                    "MAX! device %s still reports %s°C (mode %s) instead of %s°C (mode %s), "
+                    "showing the cube's value",
+                    rf_address, device.target_temperature, device.mode, temperature, mode,
+                )
+
+    def _take_snapshot(self) -> MaxCubeSnapshot:
+        """Copy the model, sharing the devices that did not change since the last copy."""
+        previous = self.data["snapshot"] if self.data else None
+        return MaxCubeSnapshot.take(self.cube, previous)
+
+    def _build_data(self, snapshot: MaxCubeSnapshot) -> dict:
+        """Prepare data for platforms from a snapshot taken at the end of an access job."""
+        previous = self.data["snapshot"] if self.data else None
+        changes = snapshot.diff(previous)
+        if self.debug_mode and changes:
+            _LOGGER.debug("MAX! Cube state changed: %r", changes)
+
+        # Only a moved valve or a changed device list can change heat demand
+        if (
+            previous is None
+            or changes.devices_added
+            or changes.devices_removed
+            or any("valve_position" in fields for fields in changes.devices.values())
+        ):
+            heat_demand = self._calculate_heat_demand(snapshot)
+        else:
+            heat_demand = self.data["heat_demand"]
+
+        return {
+            "cube": self.cube,
+            "devices": self.cube.devices,
+            "rooms": self.cube.rooms,
+            "snapshot": snapshot,
+            "changes": changes,
+            "heat_demand": heat_demand,
+            "duty_cycle": snapshot.duty_cycle,
+            # Set while the data comes from the cache of the last run, or
+            # polls are failing and only writes reach the cube
+            "stale": self._restored_from_cache or self._stale_since is not None,
+        }
 
-    def _calculate_heat_demand(self, cube: MaxCube) -> bool:
+    @callback
+    def async_add_device_listener(
+        self,
+        device_rf_address: str,
+        update_callback: Callable[[], None],
+        fields: tuple[str, ...] | None = None,
+    ) -> CALLBACK_TYPE:
+        """Call update_callback when one of the device's fields changes, all fields if None."""
+        listener = (update_callback, frozenset(fields) if fields else None)
+        self._device_listeners.setdefault(device_rf_address, []).append(listener)
+
+        @callback
+        def remove_listener() -> None:
+            listeners = self._device_listeners.get(device_rf_address, [])
+            if listener in listeners:
+                listeners.remove(listener)
+            if not listeners:
+                self._device_listeners.pop(device_rf_address, None)
+
+        return remove_listener
+
+    @callback
+    def async_update_listeners(self) -> None:
+        """Update coordinator listeners, and device listeners whose device changed."""
+        super().async_update_listeners()
+        self._async_update_device_listeners()
+
+    @callback
+    def _async_update_device_listeners(self) -> None:
+        """Notify device listeners once per new set of changes."""
+        stale = bool(self.data and self.data["stale"])
+        # While stale every update rewrites all entities so their data age moves on
+        availability_changed = (
+            self._notified_success != self.last_update_success
+            or self._notified_stale != stale
+            or stale
+        )
+        self._notified_success = self.last_update_success
+        self._notified_stale = stale
+        changes = self.data["changes"] if self.data else None
+        if changes is self._notified_changes and not availability_changed:
+            return
+        self._notified_changes = changes
+
+        for rf_address, listeners in list(self._device_listeners.items()):
+            if availability_changed or changes is None:
+                changed = None
+            elif rf_address in changes.devices_added:
+                changed = None
+            elif rf_address in changes.devices:
+                changed = frozenset(changes.devices[rf_address])
+            else:
+                continue
+            for update_callback, fields in list(listeners):
+                if changed is None or fields is None or fields & changed:
+                    update_callback()
+
+    def _adapt_update_interval(self, data: dict) -> None:
+        """Pick the time until the next poll, adaptively when that is enabled."""
+        if self._poll_interval is None:
+            self.update_interval = self._base_update_interval
+            return
+        seconds = self._poll_interval.update(
+            data["changes"], data["snapshot"], bool(self._optimistic)
+        )
+        self.update_interval = timedelta(seconds=seconds)
+
+    def device_state(self, device_rf_address: str):
+        """Return a device's state as of the last completed poll or command."""
+        if not self.data:
+            return None
+        return self.data["snapshot"].device(device_rf_address)
+
+    def _handle_metadata_changes(self) -> None:
+        """Rebuild entities only when rooms or devices structurally changed."""
+        # Changes stay with the cube until taken here, also those seen by a
+        # dump that was interrupted and ran again
+        changes = self.cube.pop_metadata_changes()
+        if not changes:
+            return
+
+        _LOGGER.info("MAX! Cube configuration changed (%r), reloading entities", changes)
+        self.hass.async_create_task(
+            self.hass.config_entries.async_reload(self.entry.entry_id)
+        )
+
+    def _calculate_heat_demand(self, snapshot: MaxCubeSnapshot) -> bool:
         """Calculate if there's heat demand based on valve positions."""
         min_valve_position = self.entry.data.get("min_valve_position", 25)
         
-        for device in cube.devices:
-            if (cube.is_thermostat(device) and 
-                device.valve_position is not None and 
+        for device in snapshot.devices_by_type(MAX_THERMOSTAT, MAX_THERMOSTAT_PLUS):
+            if (device.valve_position is not None and 
                 device.valve_position > min_valve_position):
                 return True
         
         return False
 
-    async def set_target_temperature(self, device_rf_address: str, temperature: float) -> None:
+    async def set_target_temperature(
+        self, device_rf_address: str, temperature: float, low_priority: bool = False
+    ) -> None:
         """Set target temperature for a device."""
+        if not self.cube.device_by_rf(device_rf_address):
+            _LOGGER.error("Device %s not found", device_rf_address)
+            return
+
         try:
-            connection = MaxCubeConnection(self.cube_address, self.cube_port)
-            cube = MaxCube(connection)
-            cube.update()
-            
-            device = cube.device_by_rf(device_rf_address)
-            if device:
-                cube.set_target_temperature(device, temperature)
-                _LOGGER.info("Set temperature %s for device %s", temperature, device_rf_address)
-            else:
-                _LOGGER.error("Device %s not found", device_rf_address)
-                
+            await self._command_queue.async_enqueue(
+                device_rf_address, temperature=temperature, low_priority=low_priority
+            )
+            _LOGGER.info("Set temperature %s for device %s", temperature, device_rf_address)
+        except HomeAssistantError:
+            # The cube is busy or refused, let the caller know
+            raise
         except Exception as err:
             _LOGGER.error("Error setting temperature: %s", err)
 
-    async def set_mode(self, device_rf_address: str, mode: int) -> None:
+    async def set_mode(
+        self, device_rf_address: str, mode: int, low_priority: bool = False
+    ) -> None:
         """Set mode for a device."""
+        if not self.cube.device_by_rf(device_rf_address):
+            _LOGGER.error("Device %s not found", device_rf_address)
+            return
+
         try:
-            connection = MaxCubeConnection(self.cube_address, self.cube_port)
-            cube = MaxCube(connection)
-            cube.update()
-            
-            device = cube.device_by_rf(device_rf_address)
-            if device:
-                cube.set_mode(device, mode)
-                _LOGGER.info("Set mode %s for device %s", mode, device_rf_address)
-            else:
-                _LOGGER.error("Device %s not found", device_rf_address)
-                
+            await self._command_queue.async_enqueue(
+                device_rf_address, mode=mode, low_priority=low_priority
+            )
+            _LOGGER.info("Set mode %s for device %s", mode, device_rf_address)
+        except HomeAssistantError:
+            # The cube is busy or refused, let the caller know
+            raise
         except Exception as err:
             _LOGGER.error("Error setting mode: %s", err)
 
+    async def _async_send_command(
+        self, device_rf_address: str, temperature: float | None, mode: int | None
+    ) -> None:
+        """Send one coalesced write, served from the cached model as a single s: exchange."""
+        device = self.cube.device_by_rf(device_rf_address)
+        if not device:
+            raise ValueError(f"Device {device_rf_address} not found")
+
+        if temperature is None:
+            temperature = device.target_temperature
+        if mode is None:
+            mode = device.mode
+
+        async def async_write() -> MaxCubeSnapshot | None:
+            # Timed inside the access job, so waiting for a poll does not count
+            with self.telemetry.timer(METRIC_COMMAND_TIME):
+                accepted = await self.cube.async_set_temperature_mode(device, temperature, mode)
+            self._update_scheduler()
+            if not accepted:
+                return None
+            # The S: reply confirmed the write and the model already holds
+            # it, show it until a poll reports it or the grace runs out
+            self._optimistic[device_rf_address] = (
+                device.target_temperature,
+                device.mode,
+                time.monotonic() + COMMAND_CONFIRM_GRACE,
+            )
+            return self._take_snapshot()
+
+        try:
+            snapshot = await self._access.async_run(PRIORITY_WRITE, async_write)
+        except Exception:
+            self.telemetry.increment(METRIC_COMMAND_FAILURES)
+            raise
+        if snapshot is None:
+            self.telemetry.increment(METRIC_COMMAND_FAILURES)
+            if self.cube.command_discarded is None:
+                raise HomeAssistantError(
+                    f"MAX! Cube did not confirm command for {device_rf_address}"
+                )
+            raise HomeAssistantError(
+                f"MAX! Cube did not accept command for {device_rf_address} "
+                f"(duty cycle {self.cube.duty_cycle}%)"
+            )
+
+        # Push the write to the entities now and reconcile on the next poll
+        data = self._build_data(snapshot)
+        self._adapt_update_interval(data)
+        # Not async_set_updated_data: that restarts the poll timer, and a
+        # stream of writes would keep pushing the confirming poll away
+        self.data = data
+        self.async_update_listeners()
+        self._schedule_confirm()
+
+    def _schedule_confirm(self) -> None:
+        """Make sure a poll confirms the accepted writes before their grace runs out."""
+        if self._confirm_timer is None:
+            self._confirm_timer = self.hass.loop.call_later(
+                COMMAND_CONFIRM_DELAY, self._start_confirm
+            )
+
+    def _start_confirm(self) -> None:
+        """Poll now if writes are still waiting for the cube to report them."""
+        self._confirm_timer = None
+        if self._optimistic:
+            self.hass.async_create_task(self.async_request_refresh())
+
     async def reload_devices(self) -> None:
         """Reload all devices by scanning the cube again."""
         try:
             _LOGGER.info("Reloading MAX! Cube devices...")
             
-            # Force a fresh connection and scan
-            connection = MaxCubeConnection(self.cube_address, self.cube_port)
-            cube = MaxCube(connection)
-            cube.update()
-            
+            async def async_rescan() -> MaxCubeSnapshot:
+                # Force a fresh greeting with all metadata and configuration
+                await self.cube.async_rescan()
+                self._reconcile_optimistic()
+                return self._take_snapshot()
+
+            snapshot = await self._access.async_run(
+                PRIORITY_RESCAN, async_rescan, interruptible=True
+            )
+            if self._cube_initialized:
+                self._handle_metadata_changes()
+            else:
+                self.cube.pop_metadata_changes()
+            self._cube_initialized = True
+            self._cache.async_schedule_save(self.cube)
+
             # Update the coordinator data
-            await self.async_request_refresh()
-            
-            _LOGGER.info("Successfully reloaded %s devices and %s rooms", 
-                        len(cube.devices), len(cube.rooms))
+            self.async_set_updated_data(self._build_data(snapshot))
+
+            _LOGGER.info("Successfully reloaded %s devices and %s rooms",
+                        len(self.cube.devices), len(self.cube.rooms))
             
         except Exception as err:
             _LOGGER.error("Error reloading devices: %s", err)
@@ -148,4 +549,19 @@ class MaxCubeCoordinator(DataUpdateCoordinator):
             _LOGGER.error("Error clearing and reloading devices: %s", err)
             raise
 
+    async def async_shutdown(self) -> None:
+        """Close the cube session when the coordinator is torn down."""
+        await super().async_shutdown()
+        if self._confirm_timer is not None:
+            self._confirm_timer.cancel()
+            self._confirm_timer = None
+        await self._command_queue.async_shutdown()
+        await self._access.async_shutdown()
+        await self._connection.async_disconnect()
+        if self._capture is not None:
+            await self.hass.async_add_executor_job(self._capture.close)
+        if self._cube_initialized:
+            # Keep the latest readings for the next start
+            await self._cache.async_save(self.cube)
+
 # GPIO status methods removed - were causing issues
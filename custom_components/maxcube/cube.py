@@ -1,6 +1,8 @@
 import base64
+import contextlib
 import struct
 
+from .changes import MaxCubeChanges
 from .device import \
     MaxDevice, \
     MAX_CUBE, \
@@ -12,6 +14,13 @@ from .device import \
     MAX_DEVICE_MODE_MANUAL, \
     MAX_DEVICE_BATTERY_OK, \
     MAX_DEVICE_BATTERY_LOW
+from .parser import \
+    MaxCubeStreamParser, \
+    EVENT_COMMAND_RESULT, \
+    EVENT_CONFIG, \
+    EVENT_HELLO, \
+    EVENT_LIVE_STATUS, \
+    EVENT_METADATA
 from .room import MaxRoom
 from .thermostat import MaxThermostat
 from .wallthermostat import MaxWallThermostat
@@ -20,22 +29,95 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Live status record: length and rf address, an unknown byte and two flag
+# bytes. The length byte and the 3 byte rf address are read as one integer.
+LIVE_STATUS_HEADER = struct.Struct('>IxBB')
+# Fields following the flags: valve position, target and actual temperature
+THERMOSTAT_STATUS = struct.Struct('>BBH')
+# Wall thermostats send target, then date and time, then the actual temperature
+WALL_THERMOSTAT_STATUS = struct.Struct('>xB3xB')
+
+
+def decode_thermostat_status(device, data, pos, flags):
+    valve_position, target, actual = THERMOSTAT_STATUS.unpack_from(data, pos + 7)
+    device.target_temperature = (target & 0x7F) / 2.0
+    device.mode = flags & 3
+    device.valve_position = valve_position
+    if device.mode == MAX_DEVICE_MODE_MANUAL or device.mode == MAX_DEVICE_MODE_AUTOMATIC:
+        # The thermostat only reports a reading after its valve moved
+        if actual != 0:
+            device.actual_temperature = actual / 10.0
+    else:
+        device.actual_temperature = None
+
+
+def decode_wall_thermostat_status(device, data, pos, flags):
+    target, actual = WALL_THERMOSTAT_STATUS.unpack_from(data, pos + 7)
+    device.target_temperature = (target & 0x7F) / 2.0
+    device.mode = flags & 3
+    device.actual_temperature = (((target & 0x80) << 1) + actual) / 10.0
+
+
+def decode_window_shutter_status(device, data, pos, flags):
+    device.is_open = (flags & 0x03) > 0
+
+
+LIVE_STATUS_DECODERS = {
+    MAX_THERMOSTAT: decode_thermostat_status,
+    MAX_THERMOSTAT_PLUS: decode_thermostat_status,
+    MAX_WALL_THERMOSTAT: decode_wall_thermostat_status,
+    MAX_WINDOW_SHUTTER: decode_window_shutter_status,
+}
+
+DEVICE_CLASSES = {
+    MAX_THERMOSTAT: MaxThermostat,
+    MAX_THERMOSTAT_PLUS: MaxThermostat,
+    MAX_WALL_THERMOSTAT: MaxWallThermostat,
+    MAX_WINDOW_SHUTTER: MaxWindowShutter,
+}
+
 
 class MaxCube(MaxDevice):
-    def __init__(self, connection):
+    def __init__(self, connection, auto_init=True):
         super(MaxCube, self).__init__()
         self.connection = connection
         self.name = 'Cube'
         self.type = MAX_CUBE
         self.firmware_version = None
+        # Share of the RF airtime budget in use (percent), free command slots
+        # and whether the cube discarded the last command, from H: and S:
+        self.duty_cycle = None
+        self.free_memory_slots = None
+        self.command_discarded = None
+        # Counts the H: and S: messages that reported the duty cycle, so a
+        # caller can tell a new reading from the one it has already seen
+        self.duty_cycle_reading = 0
         self.devices = []
         self.rooms = []
-        self.init()
+        # Lookup indexes, rebuilt by reindex() whenever devices or rooms change
+        self._devices_by_rf = {}
+        self._rooms_by_id = {}
+        self._devices_by_room_id = {}
+        self._devices_by_type = {}
+        # What M messages added, removed or renamed since the changes were
+        # last taken with pop_metadata_changes(), so none are lost when an
+        # update is interrupted after its M message.
+        self.metadata_changes = MaxCubeChanges()
+        # Set until an M message was parsed, or when the live status mentions
+        # a device the metadata does not know about.
+        self.metadata_stale = True
+        # Async connections cannot be used from here, call async_init() instead
+        if auto_init:
+            self.init()
 
     def init(self):
         self.update()
         self.log()
 
+    async def async_init(self):
+        await self.async_update()
+        self.log()
+
     def log(self):
         logger.info('Cube (rf=%s, firmware=%s)' % (self.rf_address, self.firmware_version))
         for device in self.devices:
@@ -63,66 +145,154 @@ class MaxCube(MaxDevice):
                 logger.info('Device (rf=%s, name=%s' % (device.rf_address, device.name))
 
     def update(self):
-        self.connection.connect()
-        response = self.connection.response
-        self.parse_response(response)
-        self.connection.disconnect()
+        with self.streaming() as streamed:
+            if self.can_poll_live_status():
+                # Metadata and configuration are known, only ask for the
+                # live status instead of re-receiving the whole dump.
+                self.connection.send('l:\r\n')
+            else:
+                self.connection.connect()
+            if not streamed:
+                self.parse_response(self.connection.response)
+            if not self.is_persistent():
+                self.connection.disconnect()
+
+    async def async_update(self):
+        with self.streaming() as streamed:
+            if self.can_poll_live_status():
+                await self.connection.async_send('l:\r\n')
+            else:
+                await self.connection.async_connect()
+            if not streamed:
+                self.parse_response(self.connection.response)
+            if not self.is_persistent():
+                await self.connection.async_disconnect()
+
+    def rescan(self):
+        """Re-read rooms, devices and configuration from a fresh greeting."""
+        self.metadata_stale = True
+        self.update()
+
+    async def async_rescan(self):
+        self.metadata_stale = True
+        await self.async_update()
+
+    def pop_metadata_changes(self):
+        """Return the metadata changes collected so far and start over."""
+        changes = self.metadata_changes
+        self.metadata_changes = MaxCubeChanges()
+        return changes
+
+    def can_poll_live_status(self):
+        # The cube only sends M and C messages when a client connects, so
+        # l: is enough as long as the session stays open.
+        return self.is_persistent() and self.connection.is_connected() and not self.metadata_stale
+
+    @contextlib.contextmanager
+    def streaming(self):
+        """Parse messages while they arrive if the connection supports it."""
+        streamed = hasattr(self.connection, 'listener')
+        if streamed:
+            self.connection.listener = self.handle_event
+        try:
+            yield streamed
+        finally:
+            if streamed:
+                self.connection.listener = None
+
+    def is_persistent(self):
+        return getattr(self.connection, 'persistent', False)
 
     def get_devices(self):
         return self.devices
 
     def device_by_rf(self, rf):
-        for device in self.devices:
-            if device.rf_address == rf:
-                return device
-        return None
+        if isinstance(rf, str):
+            try:
+                rf = int(rf, 16)
+            except ValueError:
+                return None
+        return self._devices_by_rf.get(rf)
 
     def devices_by_room(self, room):
-        rooms = []
+        return self.devices_by_room_id(room.id)
 
-        for device in self.devices:
-            if device.room_id is not None and room.id is not None and device.room_id == room.id:
-                rooms.append(device)
+    def devices_by_room_id(self, room_id):
+        if room_id is None:
+            return []
+        return list(self._devices_by_room_id.get(room_id, ()))
 
-        return rooms
+    def devices_by_type(self, *device_types):
+        devices = []
+        for device_type in device_types:
+            devices.extend(self._devices_by_type.get(device_type, ()))
+        return devices
 
     def get_rooms(self):
         return self.rooms
 
     def room_by_id(self, id):
+        if id is None:
+            return None
+        return self._rooms_by_id.get(id)
+
+    def reindex(self):
+        devices_by_rf = {}
+        devices_by_room_id = {}
+        devices_by_type = {}
+        for device in self.devices:
+            devices_by_rf[device.rf] = device
+            if device.room_id is not None:
+                devices_by_room_id.setdefault(device.room_id, []).append(device)
+            devices_by_type.setdefault(device.type, []).append(device)
+
+        rooms_by_id = {}
         for room in self.rooms:
-            if room.id is not None and id is not None and room.id == id:
-                return room
-        return None
+            # Keep the first room for an id, like the linear lookup used to
+            if room.id is not None and room.id not in rooms_by_id:
+                rooms_by_id[room.id] = room
+
+        self._devices_by_rf = devices_by_rf
+        self._rooms_by_id = rooms_by_id
+        self._devices_by_room_id = devices_by_room_id
+        self._devices_by_type = devices_by_type
 
     def parse_response(self, response):
+        parser = MaxCubeStreamParser()
+        for event in parser.iter_events([str(response).encode('utf-8')]):
+            self.handle_event(event)
+
+    def handle_event(self, event):
+        message = event.message
+        if event.type == EVENT_COMMAND_RESULT:
+            self.parse_s_message(message)
+            return
+
+        if len(message) <= 10:
+            return
+
+        if event.type == EVENT_LIVE_STATUS:
+            self.parse_l_message(message)
+            return
+
         try:
-            lines = str(response).split('\n')
-        except:
-            lines = str(response).split('\n')
-
-        for line in lines:
-            line = line.strip()
-            if line and len(line) > 10:
-                if line[:1] == 'C':
-                    self.parse_c_message(line.strip())
-                elif line[:1] == 'H':
-                    self.parse_h_message(line.strip())
-                elif line[:1] == 'L':
-                    self.parse_l_message(line.strip())
-                elif line[:1] == 'M':
-                    self.parse_m_message(line.strip())
+            if event.type == EVENT_CONFIG:
+                self.parse_c_message(message)
+            elif event.type == EVENT_HELLO:
+                self.parse_h_message(message)
+            elif event.type == EVENT_METADATA:
+                self.parse_m_message(message)
+        except Exception:
+            # Part of the greeting is missing from the model, re-read all of it
+            self.metadata_stale = True
+            raise
 
     def parse_c_message(self, message):
         logger.debug('Parsing c_message: ' + message)
-        device_rf_address = message[1:].split(',')[0][1:].upper()
-        data = bytearray(base64.b64decode(message[2:].split(',')[1]))
-
-        length = data[0]
-        rf_address = self.parse_rf_address(data[1: 3])
-        device_type = data[4]
+        tokens = message[2:].split(',')
+        data = bytearray(base64.b64decode(tokens[1]))
 
-        device = self.device_by_rf(device_rf_address)
+        device = self.device_by_rf(tokens[0])
 
         if device and self.is_thermostat(device):
             device.comfort_temperature = data[18] / 2.0
@@ -145,14 +315,31 @@ class MaxCube(MaxDevice):
     def parse_h_message(self, message):
         logger.debug('Parsing h_message: ' + message)
         tokens = message[2:].split(',')
-        self.rf_address = tokens[1]
+        self.rf_address = self.parse_rf_address(bytes.fromhex(tokens[1]))
         self.firmware_version = (tokens[2][0:2]) + '.' + (tokens[2][2:4])
+        if len(tokens) > 6:
+            self.duty_cycle = int(tokens[5], 16)
+            self.free_memory_slots = int(tokens[6], 16)
+            self.duty_cycle_reading += 1
+
+    def parse_s_message(self, message):
+        logger.debug('Parsing s_message: ' + message)
+        tokens = message[2:].split(',')
+        if len(tokens) < 3:
+            return
+        self.duty_cycle = int(tokens[0], 16)
+        self.command_discarded = tokens[1].strip() != '0'
+        self.free_memory_slots = int(tokens[2], 16)
+        self.duty_cycle_reading += 1
 
     def parse_m_message(self, message):
         logger.debug('Parsing m_message: ' + message)
         data = bytearray(base64.b64decode(message[2:].split(',')[2]))
         num_rooms = data[2]
 
+        changes = MaxCubeChanges()
+
+        rooms = []
         pos = 3
         for _ in range(0, num_rooms):
             room_id = struct.unpack('bb', data[pos:pos + 2])[0]
@@ -160,132 +347,210 @@ class MaxCube(MaxDevice):
             pos += 1 + 1
             name = data[pos:pos + name_length].decode('utf-8')
             pos += name_length
-            device_rf_address = self.parse_rf_address(data[pos: pos + 3])
             pos += 3
 
-            room = MaxRoom()
-            room.id = room_id
+            room = self._rooms_by_id.get(room_id)
+            if not room:
+                room = MaxRoom()
+                room.id = room_id
+                changes.rooms_added.append(room)
+            elif room.name != name:
+                changes.rooms_renamed.append(room)
             room.name = name
-            self.rooms.append(room)
+            rooms.append(room)
 
         num_devices = data[pos]
         pos += 1
 
+        devices = []
         for device_idx in range(0, num_devices):
             device_type = data[pos]
-            device_rf_address = self.parse_rf_address(data[pos + 1: pos + 1 + 3])
+            device_rf = self.parse_rf_address(data[pos + 1: pos + 1 + 3])
             device_serial = data[pos + 4: pos + 14].decode('utf-8')
             device_name_length = data[pos + 14]
             device_name = data[pos + 15: pos + 15 + device_name_length].decode('utf-8')
             room_id = data[pos + 15 + device_name_length]
 
-            device = self.device_by_rf(device_rf_address)
-
-            if not device:
-                if device_type == MAX_THERMOSTAT or device_type == MAX_THERMOSTAT_PLUS:
-                    device = MaxThermostat()
+            device = self._devices_by_rf.get(device_rf)
+            device_class = DEVICE_CLASSES.get(device_type)
 
-                if device_type == MAX_WINDOW_SHUTTER:
-                    device = MaxWindowShutter()
+            if device and type(device) is not device_class:
+                # Same address re-paired as another kind of device
+                device = None
 
-                if device_type == MAX_WALL_THERMOSTAT:
-                    device = MaxWallThermostat()
-
-                if device:
-                    self.devices.append(device)
+            if not device and device_class:
+                device = device_class()
+                changes.devices_added.append(device)
+            elif device:
+                if device.name != device_name:
+                    changes.devices_renamed.append(device)
+                if device.room_id != room_id:
+                    changes.devices_moved.append(device)
 
             if device:
                 device.type = device_type
-                device.rf_address = device_rf_address
+                device.rf_address = device_rf
                 device.room_id = room_id
                 device.name = device_name
                 device.serial = device_serial
+                devices.append(device)
 
             pos += 1 + 3 + 10 + device_name_length + 2
 
+        kept_rooms = set(id(room) for room in rooms)
+        changes.rooms_removed = [room for room in self.rooms if id(room) not in kept_rooms]
+        kept_devices = set(id(device) for device in devices)
+        changes.devices_removed = [device for device in self.devices if id(device) not in kept_devices]
+
+        # Update in place so references to these lists stay valid
+        self.rooms[:] = rooms
+        self.devices[:] = devices
+        self.metadata_changes.update(changes)
+        self.metadata_stale = False
+        self.reindex()
+
+        if changes:
+            logger.debug('Metadata changed: %r' % changes)
+
     def parse_l_message(self, message):
         logger.debug('Parsing l_message: ' + message)
-        data = bytearray(base64.b64decode(message[2:]))
+        data = base64.b64decode(message[2:])
+        size = len(data)
+        devices = self._devices_by_rf
         pos = 0
 
-        while pos < len(data):
+        while pos < size:
             length = data[pos]
-            device_rf_address = self.parse_rf_address(data[pos + 1: pos + 4])
-            flags = data[pos + 5: pos + 6]
-
-            device = self.device_by_rf(device_rf_address)
+            if pos + length + 1 > size or length < LIVE_STATUS_HEADER.size - 1:
+                logger.debug('Truncated live status record at %d' % pos)
+                break
+            head, flags1, flags2 = LIVE_STATUS_HEADER.unpack_from(data, pos)
+            device = devices.get(head & 0xFFFFFF)
 
             if device:
-                bits1, bits2 = struct.unpack('BB', bytearray(data[pos + 5: pos + 7]))
-                device.battery = self.resolve_device_battery(bits2)
-
-            # Thermostat or Wall Thermostat
-            if device and (self.is_thermostat(device) or self.is_wallthermostat(device)):
-                device.target_temperature = (data[pos + 8] & 0x7F) / 2.0
-                bits1, bits2 = struct.unpack('BB', bytearray(data[pos + 5: pos + 7]))
-                device.mode = self.resolve_device_mode(bits2)
-
-            # Thermostat
-            if device and self.is_thermostat(device):
-                device.valve_position = data[pos + 7]
-                if device.mode is not None and (device.mode == MAX_DEVICE_MODE_MANUAL or device.mode == MAX_DEVICE_MODE_AUTOMATIC):
-                    actual_temperature = ((data[pos + 9] & 0xFF) * 256 + (data[pos + 10] & 0xFF)) / 10.0
-                    if actual_temperature != 0:
-                        device.actual_temperature = actual_temperature
-                else:
-                    device.actual_temperature = None
-
-            # Wall Thermostat
-            if device and self.is_wallthermostat(device):
-                device.actual_temperature = (((data[pos + 8] & 0x80) << 1) + data[pos + 12]) / 10.0
-
-            # Window Shutter
-            if device and self.is_windowshutter(device):
-                status = data[pos + 6] & 0x03
-                if status > 0:
-                    device.is_open = True
-                else:
-                    device.is_open = False
+                device.battery = flags2 >> 7
+                decoder = LIVE_STATUS_DECODERS.get(device.type)
+                if decoder:
+                    try:
+                        decoder(device, data, pos, flags2)
+                    except struct.error:
+                        logger.debug('Short live status record for %s' % device.rf_address)
+            elif not self.metadata_stale:
+                logger.debug('Live status for unknown device %06X, metadata will be re-read' % (head & 0xFFFFFF))
+                self.metadata_stale = True
 
             # Advance our pointer to the next submessage
             pos += length + 1
 
     def set_target_temperature(self, thermostat, temperature):
+        if not self.can_set_temperature(thermostat):
+            return False
+        return self.set_temperature_mode(thermostat, temperature, thermostat.mode)
+
+    async def async_set_target_temperature(self, thermostat, temperature):
+        if not self.can_set_temperature(thermostat):
+            return False
+        return await self.async_set_temperature_mode(thermostat, temperature, thermostat.mode)
+
+    def can_set_temperature(self, thermostat):
         if not self.is_thermostat(thermostat) and not self.is_wallthermostat(thermostat):
             logger.error('%s is no (wall-)thermostat!', thermostat.rf_address)
-            return
+            return False
 
         if thermostat.mode is None:
             logger.error('Thermostat mode is None, cannot set temperature')
-            return
+            return False
 
-        self.set_temperature_mode(thermostat, temperature, thermostat.mode)
+        return True
 
     def set_mode(self, thermostat, mode):
+        if not self.can_set_mode(thermostat):
+            return False
+        return self.set_temperature_mode(thermostat, thermostat.target_temperature, mode)
+
+    async def async_set_mode(self, thermostat, mode):
+        if not self.can_set_mode(thermostat):
+            return False
+        return await self.async_set_temperature_mode(thermostat, thermostat.target_temperature, mode)
+
+    def can_set_mode(self, thermostat):
         if not self.is_thermostat(thermostat) and not self.is_wallthermostat(thermostat):
             logger.error('%s is no (wall-)thermostat!', thermostat.rf_address)
-            return
+            return False
 
         if thermostat.target_temperature is None:
             logger.error('Thermostat target temperature is None, cannot set mode')
-            return
+            return False
 
-        self.set_temperature_mode(thermostat, thermostat.target_temperature, mode)
+        return True
 
     def set_temperature_mode(self, thermostat, temperature, mode):
+        command = self.temperature_mode_command(thermostat, temperature, mode)
+        if command is None:
+            return False
+
+        self.command_discarded = None
+        with self.streaming() as streamed:
+            if self.is_persistent():
+                self.connection.send(command)
+                logger.debug('Response: ' + self.connection.response)
+            else:
+                self.connection.connect()
+                self.connection.send(command)
+                logger.debug('Response: ' + self.connection.response)
+                self.connection.disconnect()
+            if not streamed:
+                self.parse_response(self.connection.response)
+        return self.apply_temperature_mode(thermostat, temperature, mode)
+
+    async def async_set_temperature_mode(self, thermostat, temperature, mode):
+        command = self.temperature_mode_command(thermostat, temperature, mode)
+        if command is None:
+            return False
+
+        self.command_discarded = None
+        with self.streaming() as streamed:
+            if self.is_persistent():
+                await self.connection.async_send(command)
+                logger.debug('Response: ' + self.connection.response)
+            else:
+                await self.connection.async_connect()
+                await self.connection.async_send(command)
+                logger.debug('Response: ' + self.connection.response)
+                await self.connection.async_disconnect()
+            if not streamed:
+                self.parse_response(self.connection.response)
+        return self.apply_temperature_mode(thermostat, temperature, mode)
+
+    def apply_temperature_mode(self, thermostat, temperature, mode):
+        if self.command_discarded is None:
+            # No S: reply, the cube may or may not have taken the command
+            logger.warning('No reply from Max! Cube to command for %s', thermostat.rf_address)
+            return False
+
+        if self.command_discarded:
+            logger.warning('Max! Cube discarded command for %s (duty cycle %s%%, %s free slots)',
+                           thermostat.rf_address, self.duty_cycle, self.free_memory_slots)
+            return False
+
+        thermostat.target_temperature = int(temperature * 2) / 2.0
+        thermostat.mode = mode
+        return True
+
+    def temperature_mode_command(self, thermostat, temperature, mode):
         logger.debug('Setting temperature %s and mode %s on %s!', temperature, mode, thermostat.rf_address)
 
         if not self.is_thermostat(thermostat) and not self.is_wallthermostat(thermostat):
             logger.error('%s is no (wall-)thermostat!', thermostat.rf_address)
-            return
+            return None
 
         # Check for None values
         if temperature is None:
             logger.error('Temperature cannot be None')
-            return
+            return None
         if mode is None:
             logger.error('Mode cannot be None')
-            return
+            return None
 
         rf_address = thermostat.rf_address
         room = str(thermostat.room_id) if thermostat.room_id is not None else '00'
@@ -301,13 +566,7 @@ class MaxCube(MaxDevice):
         logger.debug('Request: ' + byte_cmd)
         command = 's:' + base64.b64encode(bytearray.fromhex(byte_cmd)).decode('utf-8') + '\r\n'
         logger.debug('Command: ' + command)
-
-        self.connection.connect()
-        self.connection.send(command)
-        logger.debug('Response: ' + self.connection.response)
-        self.connection.disconnect()
-        thermostat.target_temperature = int(temperature * 2) / 2.0
-        thermostat.mode = mode
+        return command
 
     @classmethod
     def resolve_device_mode(cls, bits):
@@ -331,4 +590,4 @@ class MaxCube(MaxDevice):
 
     @classmethod
     def parse_rf_address(cls, address):
-        return ''.join('{:02X}'.format(x) for x in address)
+        return int.from_bytes(address, 'big')
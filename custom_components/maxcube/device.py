@@ -14,10 +14,32 @@ MAX_DEVICE_BATTERY_OK = 0
 MAX_DEVICE_BATTERY_LOW = 1
 
 class MaxDevice(object):
+    # No per-instance __dict__, a few hundred devices stay small in memory
+    __slots__ = ('type', 'rf', '_rf_address', 'room_id', 'name', 'serial', 'battery')
+
     def __init__(self):
         self.type = None
-        self.rf_address = None
+        # 24 bit rf address as an integer, rf_address is its hex string form
+        self.rf = None
+        self._rf_address = None
         self.room_id = None
         self.name = None
         self.serial = None
         self.battery = None
+
+    @property
+    def rf_address(self):
+        return self._rf_address
+
+    @rf_address.setter
+    def rf_address(self, rf_address):
+        if rf_address is None:
+            self.rf = None
+            self._rf_address = None
+        elif isinstance(rf_address, int):
+            self.rf = rf_address
+            self._rf_address = '%06X' % rf_address
+        else:
+            # Same spelling however the hex string was written
+            self.rf = int(rf_address, 16)
+            self._rf_address = '%06X' % self.rf
@@ -0,0 +1,39 @@
+"""Diagnostics support for Jan eQ-3 MAX! integration."""
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import CONF_CUBE_ADDRESS, DOMAIN
+from .coordinator import MaxCubeCoordinator
+
+TO_REDACT = {CONF_CUBE_ADDRESS}
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> dict[str, Any]:
+    """Return diagnostics for a config entry."""
+    coordinator: MaxCubeCoordinator = hass.data[DOMAIN][entry.entry_id]
+    cube = coordinator.cube
+
+    return {
+        "entry": async_redact_data(dict(entry.data), TO_REDACT),
+        "cube": {
+            "firmware_version": cube.firmware_version,
+            "duty_cycle": cube.duty_cycle,
+            "free_memory_slots": cube.free_memory_slots,
+            "rooms": len(cube.rooms),
+            "devices": len(cube.devices),
+        },
+        "polling": {
+            "update_interval": coordinator.update_interval.total_seconds(),
+            "last_update_success": coordinator.last_update_success,
+            "stale": bool(coordinator.data and coordinator.data["stale"]),
+            "data_age": coordinator.data_age,
+        },
+        "telemetry": coordinator.telemetry.as_dict(),
+    }
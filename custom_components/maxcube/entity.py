@@ -0,0 +1,49 @@
+"""Base entity for Jan eQ-3 MAX! integration."""
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.core import callback
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
+
+from .coordinator import MaxCubeCoordinator
+from .snapshot import MaxDeviceSnapshot
+
+
+class MaxCubeDeviceEntity(CoordinatorEntity[MaxCubeCoordinator]):
+    """Entity for one MAX! device, written only when the fields it shows change."""
+
+    # Device fields the entity shows, None for all of them
+    _device_fields: tuple[str, ...] | None = None
+
+    def __init__(self, coordinator: MaxCubeCoordinator, device) -> None:
+        """Initialize the device entity."""
+        super().__init__(coordinator)
+        self.device = device
+
+    @property
+    def _state(self) -> MaxDeviceSnapshot | None:
+        """Return the device state of the last completed poll, never a half-parsed one."""
+        return self.coordinator.device_state(self.device.rf_address)
+
+    @property
+    def extra_state_attributes(self) -> dict[str, Any]:
+        """Return whether the state is older than the last poll, and its age."""
+        data_age = self.coordinator.data_age
+        return {
+            "stale": self.coordinator.data["stale"],
+            "data_age": round(data_age) if data_age is not None else None,
+        }
+
+    async def async_added_to_hass(self) -> None:
+        """Subscribe to changes of this device."""
+        await super().async_added_to_hass()
+        self.async_on_remove(
+            self.coordinator.async_add_device_listener(
+                self.device.rf_address, self.async_write_ha_state, self._device_fields
+            )
+        )
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Leave state writes to the device listener, it knows what changed."""
@@ -1,19 +1,36 @@
 """eQ-3 MAX! Cube library for Home Assistant."""
 
-from .connection import MaxCubeConnection
+from .capture import MaxCubeCaptureWriter, MaxCubeReplayConnection, read_capture
+from .changes import MaxCubeChanges
+from .connection import AsyncMaxCubeConnection, MaxCubeConnection
 from .cube import MaxCube
 from .device import MaxDevice
+from .parser import MaxCubeEvent, MaxCubeStreamParser
 from .room import MaxRoom
+from .snapshot import MaxCubeSnapshot, MaxCubeSnapshotChanges, MaxDeviceSnapshot
+from .telemetry import MaxCubeTelemetry, RollingHistogram
 from .thermostat import MaxThermostat
 from .wallthermostat import MaxWallThermostat
 from .windowshutter import MaxWindowShutter
 
 __all__ = [
+    "AsyncMaxCubeConnection",
     "MaxCubeConnection",
     "MaxCube", 
+    "MaxCubeCaptureWriter",
+    "MaxCubeChanges",
     "MaxDevice",
+    "MaxDeviceSnapshot",
+    "MaxCubeEvent",
+    "MaxCubeReplayConnection",
+    "MaxCubeSnapshot",
+    "MaxCubeSnapshotChanges",
+    "MaxCubeStreamParser",
+    "MaxCubeTelemetry",
     "MaxRoom",
     "MaxThermostat",
     "MaxWallThermostat",
     "MaxWindowShutter",
+    "RollingHistogram",
+    "read_capture",
 ]
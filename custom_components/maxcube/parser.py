@@ -0,0 +1,67 @@
+import collections
+import logging
+
+logger = logging.getLogger(__name__)
+
+EVENT_HELLO = 'hello'
+EVENT_METADATA = 'metadata'
+EVENT_CONFIG = 'config'
+EVENT_LIVE_STATUS = 'live_status'
+EVENT_COMMAND_RESULT = 'command_result'
+EVENT_UNKNOWN = 'unknown'
+
+MESSAGE_EVENTS = {
+    'H': EVENT_HELLO,
+    'M': EVENT_METADATA,
+    'C': EVENT_CONFIG,
+    'L': EVENT_LIVE_STATUS,
+    'S': EVENT_COMMAND_RESULT,
+}
+
+MaxCubeEvent = collections.namedtuple('MaxCubeEvent', ['type', 'message'])
+
+
+class MaxCubeStreamParser(object):
+    """Split the cube's byte stream into one event per protocol line.
+
+    Chunks can be fed as they come off the socket, split anywhere. Every line
+    that is complete after a chunk is returned right away, so callers can act
+    on the first messages of a dump before the rest has arrived.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def feed(self, data):
+        self._buffer += data
+        events = []
+        start = 0
+        end = self._buffer.find(b'\n')
+        while end >= 0:
+            event = self.to_event(self._buffer[start:end])
+            if event:
+                events.append(event)
+            start = end + 1
+            end = self._buffer.find(b'\n', start)
+        del self._buffer[:start]
+        return events
+
+    def flush(self):
+        """Return the event for a trailing line that had no line ending."""
+        event = self.to_event(self._buffer)
+        self._buffer = bytearray()
+        return [event] if event else []
+
+    def iter_events(self, chunks):
+        for chunk in chunks:
+            for event in self.feed(chunk):
+                yield event
+        for event in self.flush():
+            yield event
+
+    @classmethod
+    def to_event(cls, line):
+        message = bytes(line).decode('utf-8').strip()
+        if not message:
+            return None
+        return MaxCubeEvent(MESSAGE_EVENTS.get(message[:1], EVENT_UNKNOWN), message)
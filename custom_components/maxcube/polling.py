@@ -0,0 +1,165 @@
+"""Poll scheduling for Jan eQ-3 MAX! integration."""
+from __future__ import annotations
+
+import logging
+import random
+import time
+
+from .const import (
+    ADAPTIVE_POLL_BACKOFF,
+    ADAPTIVE_POLL_MIN_INTERVAL,
+    CIRCUIT_BREAKER_COOLDOWN,
+    CIRCUIT_BREAKER_THRESHOLD,
+    RETRY_BACKOFF_MAX,
+    RETRY_BACKOFF_MIN,
+    RETRY_JITTER,
+)
+from .snapshot import MaxCubeSnapshot, MaxCubeSnapshotChanges
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class AdaptivePollInterval:
+    """Poll quickly while something is happening, back off while it is quiet.
+
+    Activity is a write waiting for confirmation, a valve that moved or a
+    window contact that just opened. Each quiet poll multiplies the interval
+    by the backoff factor up to the configured maximum. The shortest interval
+    grows with the cube's duty cycle, so a cube that is short on airtime is
+    not polled faster than it can act on what it learns.
+    """
+
+    def __init__(
+        self,
+        maximum: float,
+        minimum: float = ADAPTIVE_POLL_MIN_INTERVAL,
+        backoff: float = ADAPTIVE_POLL_BACKOFF,
+    ) -> None:
+        """Initialize the interval at its maximum."""
+        self.maximum = maximum
+        self.minimum = min(minimum, maximum)
+        self.backoff = backoff
+        self.interval = maximum
+
+    def update(
+        self,
+        changes: MaxCubeSnapshotChanges | None,
+        snapshot: MaxCubeSnapshot | None,
+        pending_writes: bool = False,
+    ) -> float:
+        """Return the seconds until the next poll after looking at its results."""
+        duty_cycle = snapshot.duty_cycle if snapshot else None
+        if pending_writes or self._is_active(changes, snapshot):
+            self.interval = self.fastest(duty_cycle)
+        else:
+            self.interval = max(
+                self.fastest(duty_cycle), min(self.maximum, self.interval * self.backoff)
+            )
+        return self.interval
+
+    def fastest(self, duty_cycle: int | None) -> float:
+        """Return the shortest interval allowed at this duty cycle."""
+        if not duty_cycle:
+            return self.minimum
+        share = min(duty_cycle, 100) / 100
+        return self.minimum + (self.maximum - self.minimum) * share
+
+    @staticmethod
+    def _is_active(
+        changes: MaxCubeSnapshotChanges | None, snapshot: MaxCubeSnapshot | None
+    ) -> bool:
+        """Return True if a valve moved or a window opened since the last poll."""
+        if not changes or snapshot is None:
+            return False
+        for rf_address, fields in changes.devices.items():
+            if "valve_position" in fields:
+                return True
+            if "is_open" in fields:
+                device = snapshot.device(rf_address)
+                if device is not None and device.is_open:
+                    return True
+        return False
+
+
+class PollRetryPolicy:
+    """Space out polls after failures and stop hammering a cube that keeps failing.
+
+    Each failure doubles the delay before the next attempt, with random
+    jitter so retries do not line up with other clients of the cube. After
+    threshold failures in a row the circuit opens: the cube is not contacted
+    until the cooldown has passed, then a single trial poll either closes
+    the circuit or opens it for another cooldown.
+    """
+
+    def __init__(
+        self,
+        minimum: float = RETRY_BACKOFF_MIN,
+        maximum: float = RETRY_BACKOFF_MAX,
+        jitter: float = RETRY_JITTER,
+        threshold: int = CIRCUIT_BREAKER_THRESHOLD,
+        cooldown: float = CIRCUIT_BREAKER_COOLDOWN,
+    ) -> None:
+        """Initialize the policy with the circuit closed."""
+        self.minimum = minimum
+        self.maximum = maximum
+        self.jitter = jitter
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: float | None = None
+
+    @classmethod
+    def within_budget(cls, budget: float) -> PollRetryPolicy:
+        """Return a policy whose first trial polls fall inside budget seconds of failures.
+
+        The cooldown is shortened so that, with the longest jitter, the
+        backoff before the circuit opens plus two cooldowns fit in the budget.
+        """
+        policy = cls()
+        backoff = sum(
+            min(policy.maximum, policy.minimum * 2 ** failure)
+            for failure in range(policy.threshold - 1)
+        )
+        room = budget / (1 + policy.jitter) - backoff
+        policy.cooldown = min(policy.cooldown, max(policy.minimum, room / 2))
+        return policy
+
+    @property
+    def is_open(self) -> bool:
+        """Return True while the cube is being left alone."""
+        return self.opened_at is not None
+
+    def allow_request(self) -> bool:
+        """Return True if the cube may be contacted now."""
+        return self.opened_at is None or self.remaining_cooldown() == 0
+
+    def remaining_cooldown(self) -> float:
+        """Return the seconds until the trial poll of an open circuit."""
+        if self.opened_at is None:
+            return 0
+        return max(0, self.opened_at + self.cooldown - time.monotonic())
+
+    def record_success(self) -> None:
+        """Close the circuit and forget earlier failures."""
+        if self.opened_at is not None:
+            _LOGGER.info("MAX! Cube answered again after %s failed polls", self.failures)
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self) -> float:
+        """Count a failed poll and return the seconds until the next attempt."""
+        self.failures += 1
+        if self.failures >= self.threshold:
+            if self.opened_at is None:
+                _LOGGER.warning(
+                    "MAX! Cube failed %s polls in a row, pausing polls for %s seconds",
+                    self.failures, self.cooldown,
+                )
+            self.opened_at = time.monotonic()
+            # Only ever later, an earlier poll would find the circuit still open
+            return self.cooldown * random.uniform(1, 1 + self.jitter)
+        return self._jittered(min(self.maximum, self.minimum * 2 ** (self.failures - 1)))
+
+    def _jittered(self, delay: float) -> float:
+        """Return delay moved randomly by up to the jitter share."""
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
@@ -1,4 +1,6 @@
 class MaxRoom(object):
+    __slots__ = ('id', 'name')
+
     def __init__(self):
         self.id = None
         self.name = None
@@ -0,0 +1,103 @@
+"""Duty cycle aware command pacing for Jan eQ-3 MAX! integration."""
+from __future__ import annotations
+
+import time
+from collections.abc import Callable
+
+from .const import (
+    COMMAND_BURST,
+    COMMAND_RATE,
+    DUTY_CYCLE_HIGH,
+    DUTY_CYCLE_LOW_PRIORITY_DEFER,
+)
+
+
+class DutyCycleScheduler:
+    """Token bucket that paces writes by the cube's reported RF duty cycle.
+
+    The cube may only transmit for 1% of every hour and silently drops
+    commands once that budget is used up. Tokens refill more slowly the
+    higher the last reported duty cycle. After a reading above
+    DUTY_CYCLE_HIGH low priority commands are held back for `defer` seconds,
+    and all commands are while the cube has no free slots.
+    """
+
+    def __init__(
+        self,
+        capacity: float = COMMAND_BURST,
+        rate: float = COMMAND_RATE,
+        high_water: int = DUTY_CYCLE_HIGH,
+        defer: float = DUTY_CYCLE_LOW_PRIORITY_DEFER,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Initialize the scheduler with a full bucket."""
+        self.capacity = capacity
+        self.rate = rate
+        self.high_water = high_water
+        self.defer = defer
+        self._clock = clock
+        self._tokens = capacity
+        self._refilled_at = clock()
+        self.duty_cycle: int | None = None
+        self.free_memory_slots: int | None = None
+        self._reported_at: float | None = None
+        self._reading: int | None = None
+
+    def update(
+        self,
+        duty_cycle: int | None,
+        free_memory_slots: int | None,
+        reading: int | None = None,
+    ) -> None:
+        """Take in the duty cycle and free slots from an H: or S: reply.
+
+        reading identifies the reply, a reading that was already taken in is
+        ignored so it does not restart the time it holds commands back.
+        """
+        if duty_cycle is None:
+            return
+        if reading is not None:
+            if reading == self._reading:
+                return
+            self._reading = reading
+        self._refill()
+        self.duty_cycle = duty_cycle
+        self.free_memory_slots = free_memory_slots
+        self._reported_at = self._clock()
+
+    def delay(self, low_priority: bool = False) -> float:
+        """Return how many seconds to wait before the next command may be sent."""
+        self._refill()
+        now = self._clock()
+        wait = 0.0
+
+        if self._tokens < 1:
+            wait = (1 - self._tokens) / self._effective_rate()
+
+        if self._reported_at is not None and (
+            self.free_memory_slots == 0
+            or (low_priority and self.duty_cycle >= self.high_water)
+        ):
+            # The reading only changes with the next reply, so hold back
+            # until the cube has had time to free some of its budget.
+            wait = max(wait, self._reported_at + self.defer - now)
+
+        return max(wait, 0.0)
+
+    def consume(self) -> None:
+        """Take one token for a command that is about to be sent."""
+        self._refill()
+        self._tokens -= 1
+
+    def _effective_rate(self) -> float:
+        """Refill rate, slowed down as the duty cycle budget runs out."""
+        if self.duty_cycle is None:
+            return self.rate
+        return self.rate * max(0.1, (100 - min(self.duty_cycle, 100)) / 100)
+
+    def _refill(self) -> None:
+        """Add the tokens earned since the last refill."""
+        now = self._clock()
+        elapsed = now - self._refilled_at
+        self._refilled_at = now
+        self._tokens = min(self.capacity, self._tokens + elapsed * self._effective_rate())
@@ -4,18 +4,50 @@ from __future__ import annotations
 import logging
 from typing import Any
 
-from homeassistant.components.sensor import SensorEntity, SensorDeviceClass
+from homeassistant.components.sensor import SensorEntity, SensorDeviceClass, SensorStateClass
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.const import UnitOfTemperature, PERCENTAGE
+from homeassistant.const import UnitOfInformation, UnitOfTemperature, UnitOfTime, PERCENTAGE
 from homeassistant.core import HomeAssistant
 from homeassistant.helpers.entity import EntityCategory
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
 
 from .const import DOMAIN, CONF_VALVE_POSITIONS
 from .coordinator import MaxCubeCoordinator
+from .entity import MaxCubeDeviceEntity
+from .parser import EVENT_LIVE_STATUS
+from .telemetry import (
+    METRIC_BYTES_RECEIVED,
+    METRIC_COMMAND_FAILURES,
+    METRIC_COMMAND_TIME,
+    METRIC_CONNECT_TIME,
+    METRIC_PARSE_TIME,
+    METRIC_POLL_FAILURES,
+    METRIC_POLL_TIME,
+    METRIC_POLLS_SKIPPED,
+    METRIC_READ_TIME,
+    METRIC_RECONNECTS,
+    MaxCubeTelemetry,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
+# Telemetry histograms shown as sensors: key, name and whether it holds seconds
+TELEMETRY_HISTOGRAMS = (
+    (METRIC_CONNECT_TIME, "Connect Time", True),
+    (METRIC_READ_TIME, "Read Time", True),
+    (MaxCubeTelemetry.key(METRIC_PARSE_TIME, EVENT_LIVE_STATUS), "Live Status Parse Time", True),
+    (METRIC_POLL_TIME, "Poll Time", True),
+    (METRIC_COMMAND_TIME, "Command Round Trip", True),
+    (METRIC_BYTES_RECEIVED, "Bytes per Read", False),
+)
+
+# Telemetry counters shown as sensors: name and the counters it adds up
+TELEMETRY_COUNTERS = (
+    ("Reconnects", (METRIC_RECONNECTS,)),
+    ("Failures", (METRIC_POLL_FAILURES, METRIC_POLLS_SKIPPED, METRIC_COMMAND_FAILURES)),
+)
+
 
 async def async_setup_entry(
     hass: HomeAssistant,
@@ -43,19 +75,29 @@ async def async_setup_entry(
     
         # GPIO status sensor removed - was causing issues
     
+    entities.append(MaxCubeDutyCycleSensor(coordinator))
+    entities.extend(
+        MaxCubeTelemetryHistogramSensor(coordinator, key, name, is_time)
+        for key, name, is_time in TELEMETRY_HISTOGRAMS
+    )
+    entities.extend(
+        MaxCubeTelemetryCounterSensor(coordinator, name, counters)
+        for name, counters in TELEMETRY_COUNTERS
+    )
+    
     async_add_entities(entities)
 
 
-class MaxCubeTemperatureSensor(SensorEntity):
+class MaxCubeTemperatureSensor(MaxCubeDeviceEntity, SensorEntity):
     """Representation of a MAX! temperature sensor."""
 
     _attr_device_class = SensorDeviceClass.TEMPERATURE
     _attr_native_unit_of_measurement = UnitOfTemperature.CELSIUS
+    _device_fields = ("actual_temperature",)
 
     def __init__(self, coordinator: MaxCubeCoordinator, device) -> None:
         """Initialize the temperature sensor."""
-        self.coordinator = coordinator
-        self.device = device
+        super().__init__(coordinator, device)
         
         # Set unique ID based on device RF address
         self._attr_unique_id = f"maxcube_temp_{device.rf_address}"
@@ -67,27 +109,19 @@ class MaxCubeTemperatureSensor(SensorEntity):
     @property
     def native_value(self) -> float | None:
         """Return the current temperature."""
-        return self.device.actual_temperature
+        state = self._state
+        return state.actual_temperature if state else None
 
-    @property
-    def available(self) -> bool:
-        """Return if entity is available."""
-        return self.coordinator.last_update_success
 
-    async def async_update(self) -> None:
-        """Update the entity."""
-        await self.coordinator.async_request_refresh()
-
-
-class MaxCubeValveSensor(SensorEntity):
+class MaxCubeValveSensor(MaxCubeDeviceEntity, SensorEntity):
     """Representation of a MAX! valve position sensor."""
 
     _attr_native_unit_of_measurement = PERCENTAGE
+    _device_fields = ("valve_position",)
 
     def __init__(self, coordinator: MaxCubeCoordinator, device) -> None:
         """Initialize the valve position sensor."""
-        self.coordinator = coordinator
-        self.device = device
+        super().__init__(coordinator, device)
         
         # Set unique ID based on device RF address
         self._attr_unique_id = f"maxcube_valve_{device.rf_address}"
@@ -99,16 +133,115 @@ class MaxCubeValveSensor(SensorEntity):
     @property
     def native_value(self) -> int | None:
         """Return the current valve position."""
-        return self.device.valve_position
+        state = self._state
+        return state.valve_position if state else None
+
+
+class MaxCubeDutyCycleSensor(CoordinatorEntity[MaxCubeCoordinator], SensorEntity):
+    """Representation of the MAX! Cube RF duty cycle."""
+
+    _attr_native_unit_of_measurement = PERCENTAGE
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+
+    def __init__(self, coordinator: MaxCubeCoordinator) -> None:
+        """Initialize the duty cycle sensor."""
+        super().__init__(coordinator)
+        
+        # Set unique ID, one per cube
+        self._attr_unique_id = f"maxcube_duty_cycle_{coordinator.entry.entry_id}"
+        
+        # Set name
+        self._attr_name = "MAX! Cube Duty Cycle"
+
+    @property
+    def native_value(self) -> int | None:
+        """Return the share of the RF airtime budget in use."""
+        return self.coordinator.data["snapshot"].duty_cycle
+
+    @property
+    def extra_state_attributes(self) -> dict[str, Any]:
+        """Return the command slots the cube has left."""
+        return {"free_memory_slots": self.coordinator.data["snapshot"].free_memory_slots}
+
+
+class MaxCubeTelemetryHistogramSensor(CoordinatorEntity[MaxCubeCoordinator], SensorEntity):
+    """Median of a rolling telemetry histogram, e.g. how long polls take."""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_entity_registry_enabled_default = False
+    _attr_state_class = SensorStateClass.MEASUREMENT
+
+    def __init__(
+        self, coordinator: MaxCubeCoordinator, key: str, name: str, is_time: bool
+    ) -> None:
+        """Initialize the histogram sensor."""
+        super().__init__(coordinator)
+        self._key = key
+        # Durations are recorded in seconds and shown in milliseconds
+        self._scale = 1000 if is_time else 1
+        self._attr_native_unit_of_measurement = (
+            UnitOfTime.MILLISECONDS if is_time else UnitOfInformation.BYTES
+        )
+        self._attr_unique_id = f"maxcube_telemetry_{key}_{coordinator.entry.entry_id}"
+        self._attr_name = f"MAX! Cube {name}"
+
+    def _scaled(self, value: float | None) -> float | None:
+        """Return value in the unit of the sensor."""
+        return round(value * self._scale, 3) if value is not None else None
 
     @property
-    def available(self) -> bool:
-        """Return if entity is available."""
-        return self.coordinator.last_update_success
+    def native_value(self) -> float | None:
+        """Return the median of the recent samples."""
+        histogram = self.coordinator.telemetry.histograms.get(self._key)
+        return self._scaled(histogram.percentile(50)) if histogram else None
+
+    @property
+    def extra_state_attributes(self) -> dict[str, Any]:
+        """Return the spread of the recent samples and the bucket counts."""
+        histogram = self.coordinator.telemetry.histograms.get(self._key)
+        if histogram is None:
+            return {"count": 0}
+        summary = histogram.as_dict()
+        return {
+            "count": summary["count"],
+            "p95": self._scaled(summary["p95"]),
+            "max": self._scaled(summary["max"]),
+            "buckets": {
+                f"{bound * self._scale:g}" if bound is not None else "inf": count
+                for bound, count in summary["buckets"]
+            },
+        }
+
+
+class MaxCubeTelemetryCounterSensor(CoordinatorEntity[MaxCubeCoordinator], SensorEntity):
+    """Running total of telemetry counters, e.g. failed polls and commands."""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_entity_registry_enabled_default = False
+    _attr_state_class = SensorStateClass.TOTAL_INCREASING
+
+    def __init__(
+        self, coordinator: MaxCubeCoordinator, name: str, counters: tuple[str, ...]
+    ) -> None:
+        """Initialize the counter sensor."""
+        super().__init__(coordinator)
+        self._counters = counters
+        self._attr_unique_id = (
+            f"maxcube_telemetry_{name.lower()}_{coordinator.entry.entry_id}"
+        )
+        self._attr_name = f"MAX! Cube {name}"
 
-    async def async_update(self) -> None:
-        """Update the entity."""
-        await self.coordinator.async_request_refresh()
+    @property
+    def native_value(self) -> int:
+        """Return the sum of the counters since startup."""
+        counters = self.coordinator.telemetry.counters
+        return sum(counters[counter] for counter in self._counters)
+
+    @property
+    def extra_state_attributes(self) -> dict[str, Any]:
+        """Return the counters one by one."""
+        counters = self.coordinator.telemetry.counters
+        return {counter: counters[counter] for counter in self._counters}
 
 
 # GPIO status sensor removed - was causing issues
@@ -0,0 +1,113 @@
+import collections
+import types
+
+# Every field a device snapshot can carry, None where the device type has none
+DEVICE_FIELDS = (
+    'type', 'rf_address', 'room_id', 'name', 'serial', 'battery',
+    'mode', 'target_temperature', 'actual_temperature', 'valve_position',
+    'comfort_temperature', 'eco_temperature', 'min_temperature', 'max_temperature',
+    'is_open', 'initialized',
+)
+
+MaxDeviceSnapshot = collections.namedtuple('MaxDeviceSnapshot', DEVICE_FIELDS)
+MaxRoomSnapshot = collections.namedtuple('MaxRoomSnapshot', ['id', 'name'])
+
+CUBE_FIELDS = ('duty_cycle', 'free_memory_slots')
+
+
+def snapshot_device(device):
+    return MaxDeviceSnapshot._make(getattr(device, field, None) for field in DEVICE_FIELDS)
+
+
+class MaxCubeSnapshot(object):
+    """Immutable copy of the cube model as it was at the end of one poll.
+
+    Device states are namedtuples. A device whose state did not change since
+    the previous snapshot shares that snapshot's tuple, so telling changed
+    devices apart is an identity check.
+    """
+
+    __slots__ = ('devices', 'rooms', 'duty_cycle', 'free_memory_slots', '_devices_by_rf', '_rooms_by_id')
+
+    def __init__(self, devices, rooms, duty_cycle=None, free_memory_slots=None):
+        self.devices = tuple(devices)
+        self.rooms = tuple(rooms)
+        self.duty_cycle = duty_cycle
+        self.free_memory_slots = free_memory_slots
+        self._devices_by_rf = types.MappingProxyType(dict((d.rf_address, d) for d in self.devices))
+        self._rooms_by_id = types.MappingProxyType(dict((r.id, r) for r in reversed(self.rooms)))
+
+    @classmethod
+    def take(cls, cube, previous=None):
+        previous_devices = previous._devices_by_rf if previous else {}
+        devices = []
+        for device in cube.devices:
+            state = snapshot_device(device)
+            shared = previous_devices.get(state.rf_address)
+            devices.append(shared if shared == state else state)
+
+        previous_rooms = previous.rooms if previous else ()
+        rooms = tuple(MaxRoomSnapshot(room.id, room.name) for room in cube.rooms)
+        if rooms == previous_rooms:
+            rooms = previous_rooms
+
+        return cls(devices, rooms, cube.duty_cycle, cube.free_memory_slots)
+
+    def device(self, rf_address):
+        return self._devices_by_rf.get(rf_address)
+
+    def room(self, room_id):
+        return self._rooms_by_id.get(room_id)
+
+    def devices_by_type(self, *device_types):
+        return [device for device in self.devices if device.type in device_types]
+
+    def diff(self, previous):
+        """Return the MaxCubeSnapshotChanges that lead from previous to this snapshot."""
+        changes = MaxCubeSnapshotChanges()
+        previous_devices = previous._devices_by_rf if previous else {}
+
+        for device in self.devices:
+            before = previous_devices.get(device.rf_address)
+            if before is device:
+                continue
+            if before is None:
+                changes.devices_added.append(device.rf_address)
+                continue
+            fields = tuple(field for field, old, new in zip(DEVICE_FIELDS, before, device) if old != new)
+            if fields:
+                changes.devices[device.rf_address] = fields
+
+        changes.devices_removed = [rf_address for rf_address in previous_devices
+                                   if rf_address not in self._devices_by_rf]
+        changes.rooms_changed = previous is None or self.rooms is not previous.rooms
+        changes.cube = tuple(field for field in CUBE_FIELDS
+                             if previous is None or getattr(previous, field) != getattr(self, field))
+        return changes
+
+
+class MaxCubeSnapshotChanges(object):
+    """Which devices and fields differ between two consecutive snapshots."""
+
+    def __init__(self):
+        # rf address -> names of the fields that changed
+        self.devices = {}
+        self.devices_added = []
+        self.devices_removed = []
+        self.rooms_changed = False
+        self.cube = ()
+
+    def device_changed(self, rf_address):
+        return (rf_address in self.devices or rf_address in self.devices_added)
+
+    def has_changes(self):
+        return bool(self.devices or self.devices_added or self.devices_removed
+                    or self.rooms_changed or self.cube)
+
+    def __bool__(self):
+        return self.has_changes()
+
+    def __repr__(self):
+        return ('MaxCubeSnapshotChanges(devices ~%d +%d -%d, rooms %s, cube %s)'
+                % (len(self.devices), len(self.devices_added), len(self.devices_removed),
+                   'changed' if self.rooms_changed else 'unchanged', ','.join(self.cube) or '-'))
@@ -8,9 +8,12 @@ from homeassistant.components.switch import SwitchEntity
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
 
 from .const import DOMAIN, CONF_HEAT_DEMAND_SWITCH
 from .coordinator import MaxCubeCoordinator
+from .device import MAX_WINDOW_SHUTTER
+from .entity import MaxCubeDeviceEntity
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -30,21 +33,19 @@ async def async_setup_entry(
         entities.append(MaxCubeHeatDemandSwitch(coordinator))
     
     # Create window/door contact switches
-    for device in coordinator.data["devices"]:
-        cube = coordinator.data["cube"]
-        
-        if cube.is_windowshutter(device):
-            entities.append(MaxCubeWindowShutterSwitch(coordinator, device))
+    cube = coordinator.data["cube"]
+    for device in cube.devices_by_type(MAX_WINDOW_SHUTTER):
+        entities.append(MaxCubeWindowShutterSwitch(coordinator, device))
     
     async_add_entities(entities)
 
 
-class MaxCubeHeatDemandSwitch(SwitchEntity):
+class MaxCubeHeatDemandSwitch(CoordinatorEntity[MaxCubeCoordinator], SwitchEntity):
     """Representation of a MAX! heat demand switch."""
 
     def __init__(self, coordinator: MaxCubeCoordinator) -> None:
         """Initialize the heat demand switch."""
-        self.coordinator = coordinator
+        super().__init__(coordinator)
         
         # Set unique ID
         self._attr_unique_id = "maxcube_heat_demand"
@@ -57,11 +58,6 @@ class MaxCubeHeatDemandSwitch(SwitchEntity):
         """Return if the switch is on."""
         return self.coordinator.data.get("heat_demand", False)
 
-    @property
-    def available(self) -> bool:
-        """Return if entity is available."""
-        return self.coordinator.last_update_success
-
     async def async_turn_on(self, **kwargs: Any) -> None:
         """Turn the switch on."""
         # Heat demand switch is read-only, it's controlled by valve positions
@@ -72,18 +68,15 @@ class MaxCubeHeatDemandSwitch(SwitchEntity):
         # Heat demand switch is read-only, it's controlled by valve positions
         _LOGGER.warning("Heat demand switch is read-only")
 
-    async def async_update(self) -> None:
-        """Update the entity."""
-        await self.coordinator.async_request_refresh()
-
 
-class MaxCubeWindowShutterSwitch(SwitchEntity):
+class MaxCubeWindowShutterSwitch(MaxCubeDeviceEntity, SwitchEntity):
     """Representation of a MAX! window/door contact switch."""
 
+    _device_fields = ("is_open",)
+
     def __init__(self, coordinator: MaxCubeCoordinator, device) -> None:
         """Initialize the window shutter switch."""
-        self.coordinator = coordinator
-        self.device = device
+        super().__init__(coordinator, device)
         
         # Set unique ID based on device RF address
         self._attr_unique_id = f"maxcube_contact_{device.rf_address}"
@@ -95,12 +88,8 @@ class MaxCubeWindowShutterSwitch(SwitchEntity):
     @property
     def is_on(self) -> bool:
         """Return if the switch is on (window/door is open)."""
-        return self.device.is_open
-
-    @property
-    def available(self) -> bool:
-        """Return if entity is available."""
-        return self.coordinator.last_update_success
+        state = self._state
+        return bool(state and state.is_open)
 
     async def async_turn_on(self, **kwargs: Any) -> None:
         """Turn the switch on."""
@@ -111,7 +100,3 @@ class MaxCubeWindowShutterSwitch(SwitchEntity):
         """Turn the switch off."""
         # Window shutter switches are read-only
         _LOGGER.warning("Window shutter switch is read-only")
-
-    async def async_update(self) -> None:
-        """Update the entity."""
-        await self.coordinator.async_request_refresh()
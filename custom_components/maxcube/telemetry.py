@@ -0,0 +1,115 @@
+import bisect
+import collections
+import contextlib
+import time
+
+# Upper bucket bounds for durations in seconds and for sizes in bytes
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536)
+
+# Histograms recorded by the connections
+METRIC_CONNECT_TIME = 'connect_time'
+METRIC_READ_TIME = 'read_time'
+METRIC_BYTES_RECEIVED = 'bytes_received'
+METRIC_PARSE_TIME = 'parse_time'
+# Histograms recorded by the caller: a whole poll, a command and its S: reply
+METRIC_POLL_TIME = 'poll_time'
+METRIC_COMMAND_TIME = 'command_time'
+# Counters
+METRIC_RECONNECTS = 'reconnects'
+METRIC_POLL_FAILURES = 'poll_failures'
+METRIC_POLLS_SKIPPED = 'polls_skipped'
+METRIC_COMMAND_FAILURES = 'command_failures'
+
+
+class RollingHistogram(object):
+    """Bucketed view of the last `window` samples of one measurement.
+
+    Old samples drop out as new ones arrive, so the buckets and percentiles
+    describe recent behaviour. The sample count and sum cover the whole
+    lifetime, for rates.
+    """
+
+    def __init__(self, buckets=TIME_BUCKETS, window=256):
+        self.bounds = tuple(buckets)
+        self.samples = collections.deque(maxlen=window)
+        self.count = 0
+        self.total = 0
+
+    def add(self, value):
+        self.samples.append(value)
+        self.count += 1
+        self.total += value
+
+    def percentile(self, percent):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100.0))]
+
+    def buckets(self):
+        """Return (upper bound, count) pairs for the window, None bounds the overflow."""
+        counts = [0] * (len(self.bounds) + 1)
+        for value in self.samples:
+            counts[bisect.bisect_left(self.bounds, value)] += 1
+        return list(zip(self.bounds + (None,), counts))
+
+    def as_dict(self):
+        samples = self.samples
+        return {
+            'count': self.count,
+            'total': self.total,
+            'window': len(samples),
+            'min': min(samples) if samples else None,
+            'max': max(samples) if samples else None,
+            'mean': sum(samples) / len(samples) if samples else None,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'buckets': [[bound, count] for bound, count in self.buckets()],
+        }
+
+
+class MaxCubeTelemetry(object):
+    """Rolling histograms and counters of cube operations.
+
+    Histograms are created on first use, keyed by metric name and an
+    optional label such as the message type (parse_time.live_status).
+    """
+
+    def __init__(self, window=256):
+        self.window = window
+        self.histograms = {}
+        self.counters = collections.Counter()
+
+    @classmethod
+    def key(cls, metric, label=None):
+        return metric if label is None else '%s.%s' % (metric, label)
+
+    def histogram(self, metric, label=None, buckets=TIME_BUCKETS):
+        key = self.key(metric, label)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = RollingHistogram(buckets, self.window)
+        return histogram
+
+    def observe(self, metric, value, label=None, buckets=TIME_BUCKETS):
+        self.histogram(metric, label, buckets).add(value)
+
+    def increment(self, metric, amount=1):
+        self.counters[metric] += amount
+
+    @contextlib.contextmanager
+    def timer(self, metric, label=None):
+        """Observe the seconds spent in the with block, also when it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(metric, time.perf_counter() - start, label)
+
+    def as_dict(self):
+        return {
+            'histograms': dict((key, histogram.as_dict())
+                               for key, histogram in sorted(self.histograms.items())),
+            'counters': dict(self.counters),
+        }
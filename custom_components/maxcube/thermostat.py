@@ -2,6 +2,9 @@ from .device import MaxDevice
 
 
 class MaxThermostat(MaxDevice):
+    __slots__ = ('comfort_temperature', 'eco_temperature', 'max_temperature', 'min_temperature',
+                 'valve_position', 'target_temperature', 'actual_temperature', 'mode')
+
     def __init__(self):
         super(MaxThermostat, self).__init__()
         self.comfort_temperature = None
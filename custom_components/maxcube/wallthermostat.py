@@ -2,6 +2,9 @@ from .device import MaxDevice
 
 
 class MaxWallThermostat(MaxDevice):
+    __slots__ = ('comfort_temperature', 'eco_temperature', 'max_temperature', 'min_temperature',
+                 'actual_temperature', 'target_temperature', 'mode')
+
     def __init__(self):
         super(MaxWallThermostat, self).__init__()
         self.comfort_temperature = None
@@ -2,6 +2,8 @@ from .device import MaxDevice
 
 
 class MaxWindowShutter(MaxDevice):
+    __slots__ = ('is_open', 'initialized')
+
     def __init__(self):
         super(MaxWindowShutter, self).__init__()
         self.is_open = False
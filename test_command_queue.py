@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Regression tests for MaxCubeCommandQueue: coalescing per device, flush
+order, the debounce deadline and errors reaching every waiting caller.
+Runs on an event loop with a fake clock, so no test waits for real time
+Needs Home Assistant installed
+"""
+
+import asyncio
+import importlib
+import selectors
+import sys
+import tempfile
+import traceback
+
+from cube_simulator import load_library
+
+try:
+    from homeassistant.core import HomeAssistant
+    from homeassistant.exceptions import HomeAssistantError
+except ImportError:
+    print("❌ Home Assistant is not installed, run: python setup_dev_env.py")
+    sys.exit(1)
+
+lib = load_library()
+command_queue = importlib.import_module('maxcube_lib.command_queue')
+
+
+class FakeClockSelector(selectors.DefaultSelector):
+    """Selector that moves the loop's clock forward instead of sleeping"""
+
+    def __init__(self, loop):
+        super().__init__()
+        self.loop = loop
+
+    def select(self, timeout=None):
+        if timeout is not None and timeout > 0:
+            self.loop.now += timeout
+            timeout = 0
+        return super().select(timeout)
+
+
+class FakeClockLoop(asyncio.SelectorEventLoop):
+    """Event loop whose timers fire as soon as nothing else is ready"""
+
+    def __init__(self):
+        self.now = 1000.0
+        super().__init__(FakeClockSelector(self))
+
+    def time(self):
+        return self.now
+
+
+def run_with_fake_clock(test):
+    """Run test(hass, loop) to completion on a fresh fake clock loop"""
+    loop = FakeClockLoop()
+
+    async def run():
+        hass = HomeAssistant(tempfile.gettempdir())
+        return await test(hass, loop)
+
+    try:
+        return loop.run_until_complete(run())
+    finally:
+        loop.close()
+
+
+def close_to(value, expected):
+    """Fake clock times add up step by step, allow for rounding"""
+    return abs(value - expected) < 1e-6
+
+
+def make_queue(hass, loop, sent, scheduler=None, fail=None, **kwargs):
+    """Queue that records (time, rf address, temperature, mode) for every send"""
+    if scheduler is None:
+        scheduler = lib.scheduler.DutyCycleScheduler(clock=loop.time)
+
+    async def send(rf_address, temperature, mode):
+        sent.append((loop.time(), rf_address, temperature, mode))
+        if fail:
+            raise fail
+
+    return command_queue.MaxCubeCommandQueue(hass, send, 0.5, scheduler, **kwargs)
+
+
+def test_burst_is_merged_per_device():
+    """A burst becomes one command per device, the latest values win"""
+    print("🔍 Testing coalescing of a burst...")
+
+    async def test(hass, loop):
+        sent = []
+        queue = make_queue(hass, loop, sent)
+        started = loop.time()
+        callers = [
+            queue.async_enqueue('100001', temperature=20.0),
+            queue.async_enqueue('100002', mode=1),
+            queue.async_enqueue('100001', temperature=21.5),
+            queue.async_enqueue('100001', mode=0),
+        ]
+        results = await asyncio.gather(*callers)
+        await queue.async_shutdown()
+        return started, sent, results
+
+    started, sent, results = run_with_fake_clock(test)
+    # Flushed once the debounce delay passed, in the order devices were first queued
+    assert [command[1:] for command in sent] == [('100001', 21.5, 0), ('100002', None, 1)], sent
+    assert close_to(sent[0][0], started + 0.5)
+    assert results == [None] * 4
+    print("✅ Coalescing OK")
+    return True
+
+
+def test_deadline_caps_debounce():
+    """A steady stream of writes is flushed no later than max_wait after the first"""
+    print("🔍 Testing debounce deadline...")
+
+    async def test(hass, loop):
+        sent = []
+        queue = make_queue(hass, loop, sent, max_wait=2.0)
+        started = loop.time()
+        callers = []
+        for step in range(10):
+            callers.append(asyncio.ensure_future(
+                queue.async_enqueue('100001', temperature=20.0 + step)))
+            await asyncio.sleep(0.4)
+        await asyncio.gather(*callers)
+        await queue.async_shutdown()
+        return started, sent
+
+    started, sent = run_with_fake_clock(test)
+    # Without the deadline the only flush would come 0.5 s after the last write
+    assert close_to(sent[0][0], started + 2.0), sent
+    assert sent[0][1:] == ('100001', 24.0, None), sent
+    assert sent[-1][1:] == ('100001', 29.0, None), sent
+    assert len(sent) == 2
+    print("✅ Debounce deadline OK")
+    return True
+
+
+def test_ready_commands_pass_deferred_ones():
+    """A low priority command held back by the duty cycle does not block the others"""
+    print("🔍 Testing flush order with deferred commands...")
+
+    async def test(hass, loop):
+        sent = []
+        scheduler = lib.scheduler.DutyCycleScheduler(high_water=80, defer=20, clock=loop.time)
+        scheduler.update(90, 10)
+        queue = make_queue(hass, loop, sent, scheduler=scheduler, max_defer=30)
+        started = loop.time()
+        await asyncio.gather(
+            queue.async_enqueue('100001', temperature=18.0, low_priority=True),
+            queue.async_enqueue('100002', temperature=22.0),
+        )
+        await queue.async_shutdown()
+        return started, sent
+
+    started, sent = run_with_fake_clock(test)
+    assert [command[1] for command in sent] == ['100002', '100001'], sent
+    assert close_to(sent[0][0], started + 0.5)
+    assert close_to(sent[1][0], started + 20)
+    print("✅ Flush order OK")
+    return True
+
+
+def test_errors_reach_every_waiter():
+    """Rejected and failed commands fail every caller that asked for them"""
+    print("🔍 Testing error propagation...")
+
+    async def rejected(hass, loop):
+        sent = []
+        scheduler = lib.scheduler.DutyCycleScheduler(defer=60, clock=loop.time)
+        # No free slots: held back for 60 s, longer than the queue may wait
+        scheduler.update(40, 0)
+        queue = make_queue(hass, loop, sent, scheduler=scheduler, max_defer=30)
+        results = await asyncio.gather(
+            queue.async_enqueue('100001', temperature=20.0),
+            queue.async_enqueue('100001', temperature=21.0),
+            return_exceptions=True,
+        )
+        await queue.async_shutdown()
+        return sent, results
+
+    sent, results = run_with_fake_clock(rejected)
+    assert sent == []
+    assert len(results) == 2
+    assert all(isinstance(result, HomeAssistantError) for result in results), results
+    assert 'free slots' in str(results[0])
+
+    async def failed(hass, loop):
+        sent = []
+        queue = make_queue(hass, loop, sent, fail=ValueError('cube gone'))
+        results = await asyncio.gather(
+            queue.async_enqueue('100001', temperature=20.0),
+            queue.async_enqueue('100001', mode=1),
+            queue.async_enqueue('100002', temperature=19.0),
+            return_exceptions=True,
+        )
+        await queue.async_shutdown()
+        return sent, results
+
+    sent, results = run_with_fake_clock(failed)
+    # One send per device, and its error reaches all of that device's callers
+    assert len(sent) == 2
+    assert all(isinstance(result, ValueError) for result in results), results
+    print("✅ Error propagation OK")
+    return True
+
+
+def run_command_queue_tests():
+    """Run all command queue tests"""
+    print("🚀 Running command queue tests...")
+
+    tests = [
+        ("Coalescing", test_burst_is_merged_per_device),
+        ("Debounce Deadline", test_deadline_caps_debounce),
+        ("Flush Order", test_ready_commands_pass_deferred_ones),
+        ("Error Propagation", test_errors_reach_every_waiter),
+    ]
+
+    passed = 0
+    for test_name, test_func in tests:
+        try:
+            if test_func():
+                passed += 1
+        except Exception as e:
+            print(f"❌ {test_name} FAILED with exception: {e}")
+            traceback.print_exc()
+
+    print(f"\nCOMMAND QUEUE TEST RESULTS: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = run_command_queue_tests()
+    sys.exit(0 if success else 1)
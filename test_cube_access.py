@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Regression tests for MaxCubeAccess: priorities, preemption of an
+interruptible job by a write, and its resumption on a clean cube session
+Needs Home Assistant installed, runs against the simulated MAX! Cube
+"""
+
+import asyncio
+import importlib
+import sys
+import tempfile
+import traceback
+
+from cube_simulator import MaxCubeSimulator, load_library
+
+try:
+    from homeassistant.core import HomeAssistant
+except ImportError:
+    print("❌ Home Assistant is not installed, run: python setup_dev_env.py")
+    sys.exit(1)
+
+lib = load_library()
+access = importlib.import_module('maxcube_lib.access')
+
+
+def test_write_preempts_and_resumes():
+    """A write interrupts an interruptible job, which then runs again from the start"""
+    print("🔍 Testing preemption and resumption...")
+
+    async def run():
+        hass = HomeAssistant(tempfile.gettempdir())
+        cube_access = access.MaxCubeAccess(hass)
+        order = []
+        started = asyncio.Event()
+
+        async def dump():
+            order.append('dump started')
+            started.set()
+            await asyncio.sleep(0.2)
+            order.append('dump finished')
+            return 'dump'
+
+        async def write():
+            order.append('write')
+            return 'written'
+
+        dumped = asyncio.ensure_future(cube_access.async_run(access.PRIORITY_RESCAN, dump, interruptible=True))
+        await started.wait()
+        assert await cube_access.async_run(access.PRIORITY_WRITE, write) == 'written'
+        assert await dumped == 'dump'
+        await cube_access.async_shutdown()
+        return order
+
+    order = asyncio.run(run())
+    assert order == ['dump started', 'write', 'dump started', 'dump finished'], order
+    print("✅ Preemption and resumption OK")
+    return True
+
+
+def test_uninterruptible_job_is_not_preempted():
+    """A write waits for a job that may not be interrupted"""
+    print("🔍 Testing uninterruptible job...")
+
+    async def run():
+        hass = HomeAssistant(tempfile.gettempdir())
+        cube_access = access.MaxCubeAccess(hass)
+        order = []
+        started = asyncio.Event()
+
+        async def poll():
+            started.set()
+            await asyncio.sleep(0.1)
+            order.append('poll')
+
+        async def write():
+            order.append('write')
+
+        polled = asyncio.ensure_future(cube_access.async_run(access.PRIORITY_POLL, poll))
+        await started.wait()
+        await cube_access.async_run(access.PRIORITY_WRITE, write)
+        await polled
+        await cube_access.async_shutdown()
+        return order
+
+    assert asyncio.run(run()) == ['poll', 'write']
+    print("✅ Uninterruptible job OK")
+    return True
+
+
+def test_preempted_rescan_resyncs_session():
+    """A rescan interrupted half way through the greeting restarts on a fresh session"""
+    print("🔍 Testing preempted rescan against the simulator...")
+
+    async def run(simulator):
+        hass = HomeAssistant(tempfile.gettempdir())
+        cube_access = access.MaxCubeAccess(hass)
+        connection = lib.connection.AsyncMaxCubeConnection(*simulator.address, persistent=True)
+        cube = lib.cube.MaxCube(connection, auto_init=False)
+        await cube.async_init()
+
+        simulator.latency = 0.3
+        simulator.devices[1].valve_position = 58
+        rescanned = asyncio.ensure_future(
+            cube_access.async_run(access.PRIORITY_RESCAN, cube.async_rescan, interruptible=True))
+        await asyncio.sleep(0.1)
+        simulator.latency = 0
+        accepted = await cube_access.async_run(
+            access.PRIORITY_WRITE,
+            lambda: cube.async_set_temperature_mode(cube.devices[0], 22.0, 1))
+        await rescanned
+        await cube_access.async_shutdown()
+        await connection.async_disconnect()
+        return cube, accepted
+
+    with MaxCubeSimulator(rooms=1, thermostats=2) as simulator:
+        cube, accepted = asyncio.run(run(simulator))
+
+    # First greeting, the interrupted one, the write's and the resumed rescan's
+    assert simulator.connections == 4, simulator.connections
+    assert accepted
+    assert len(cube.devices) == 2
+    assert cube.devices[0].target_temperature == 22.0
+    assert cube.device_by_rf(simulator.devices[1].rf_hex).valve_position == 58
+    assert not cube.metadata_stale
+    print("✅ Preempted rescan OK")
+    return True
+
+
+def run_access_tests():
+    """Run all access tests"""
+    print("🚀 Running cube access tests...")
+
+    tests = [
+        ("Preemption and Resumption", test_write_preempts_and_resumes),
+        ("Uninterruptible Job", test_uninterruptible_job_is_not_preempted),
+        ("Preempted Rescan", test_preempted_rescan_resyncs_session),
+    ]
+
+    passed = 0
+    for test_name, test_func in tests:
+        try:
+            if test_func():
+                passed += 1
+        except Exception as e:
+            print(f"❌ {test_name} FAILED with exception: {e}")
+            traceback.print_exc()
+
+    print(f"\nACCESS TEST RESULTS: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = run_access_tests()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+"""
+Regression tests for the connection and parser against the simulated MAX! Cube
+Runs without Home Assistant and without a real cube
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import traceback
+
+from cube_simulator import MaxCubeSimulator, load_library
+
+lib = load_library()
+
+
+def test_greeting_and_live_poll():
+    """Full greeting parses every device, l: polls on the open session"""
+    print("🔍 Testing greeting and live status poll...")
+
+    with MaxCubeSimulator(rooms=5, thermostats=2, wall_thermostats=1, window_shutters=1) as simulator:
+        connection = lib.connection.MaxCubeConnection(*simulator.address, persistent=True)
+        cube = lib.cube.MaxCube(connection)
+
+        assert len(cube.devices) == 20
+        assert len(cube.rooms) == 5
+        assert simulator.connections == 1
+        # Integer addresses inside, the same hex strings for unique ids and commands
+        assert cube.devices[0].rf == simulator.devices[0].rf_address
+        assert cube.devices[0].rf_address == simulator.devices[0].rf_hex
+        assert cube.device_by_rf(simulator.devices[0].rf_address) is cube.devices[0]
+        # The cube's own address from H: is spelled like the devices'
+        assert cube.rf_address == '0ABCDE' and cube.rf == 0x0ABCDE
+
+        simulator.devices[0].valve_position = 77
+        cube.update()
+        assert simulator.commands == ['l:']
+        assert simulator.connections == 1
+        assert cube.device_by_rf(simulator.devices[0].rf_hex).valve_position == 77
+
+        wall = next(d for d in simulator.devices if d.type == 3)
+        assert cube.device_by_rf(wall.rf_hex).actual_temperature == 19.5
+        connection.disconnect()
+
+    print("✅ Greeting and live status poll OK")
+    return True
+
+
+def test_framed_reads_do_not_wait_for_timeout():
+    """Replies return as soon as their last message is complete"""
+    print("🔍 Testing framed reads...")
+
+    with MaxCubeSimulator(rooms=2, thermostats=2, latency=0.01) as simulator:
+        connection = lib.connection.MaxCubeConnection(*simulator.address, persistent=True)
+        start = time.monotonic()
+        cube = lib.cube.MaxCube(connection)
+        cube.update()
+        elapsed = time.monotonic() - start
+        connection.disconnect()
+
+    assert elapsed < 1.0, elapsed
+    print(f"✅ Connect and poll took {elapsed * 1000:.0f} ms")
+    return True
+
+
+def test_late_reply_is_not_read_as_the_next():
+    """A reply that arrives after the timeout does not answer the next command"""
+    print("🔍 Testing late reply...")
+
+    with MaxCubeSimulator(rooms=1, thermostats=1) as simulator:
+        connection = lib.connection.MaxCubeConnection(*simulator.address, persistent=True)
+        cube = lib.cube.MaxCube(connection)
+
+        simulator.latency = 2.5
+        cube.update()
+        assert not connection.is_connected()
+        time.sleep(1)
+
+        simulator.latency = 0
+        connection.send('l:\r\n')
+        assert connection.response.startswith('H:')
+        assert connection.response.count('L:') == 2
+        connection.disconnect()
+
+    assert simulator.connections == 2
+    print("✅ Late reply OK")
+    return True
+
+
+def test_set_temperature_reply():
+    """s: updates the simulated device and the S: reply is parsed"""
+    print("🔍 Testing set temperature...")
+
+    with MaxCubeSimulator(rooms=1, thermostats=1, duty_cycle=10) as simulator:
+        connection = lib.connection.MaxCubeConnection(*simulator.address, persistent=True)
+        cube = lib.cube.MaxCube(connection)
+        device = cube.devices[0]
+
+        assert cube.set_temperature_mode(device, 22.5, 1)
+        assert simulator.devices[0].target_temperature == 22.5
+        assert simulator.devices[0].mode == 1
+        assert cube.duty_cycle == 11
+        assert cube.command_discarded is False
+        # Only H: and S: carry a new duty cycle reading, l: polls do not
+        reading = cube.duty_cycle_reading
+        cube.update()
+        assert cube.duty_cycle_reading == reading
+
+        simulator.discard_commands = True
+        assert not cube.set_temperature_mode(device, 18.0, 1)
+        assert device.target_temperature == 22.5
+
+        # Without an S: reply the write is not taken as accepted
+        simulator.answer_commands = False
+        assert not cube.set_temperature_mode(device, 25.0, 1)
+        assert cube.command_discarded is None
+        assert device.target_temperature == 22.5
+        connection.disconnect()
+
+    print("✅ Set temperature OK")
+    return True
+
+
+def test_fragmented_stream_async():
+    """The async transport reassembles a greeting split into tiny packets"""
+    print("🔍 Testing fragmented stream over asyncio...")
+
+    async def run(simulator):
+        connection = lib.connection.AsyncMaxCubeConnection(*simulator.address, persistent=True)
+        cube = lib.cube.MaxCube(connection, auto_init=False)
+        await cube.async_init()
+        await cube.async_update()
+        await connection.async_disconnect()
+        return cube
+
+    with MaxCubeSimulator(rooms=3, thermostats=3, window_shutters=1, fragment_size=7) as simulator:
+        simulator.devices[-1].is_open = True
+        cube = asyncio.run(run(simulator))
+
+    assert len(cube.devices) == 12
+    assert cube.device_by_rf(simulator.devices[-1].rf_hex).is_open is True
+    print("✅ Fragmented stream OK")
+    return True
+
+
+def test_unparsable_greeting_resyncs():
+    """A greeting that fails to parse closes the session and is read again in full"""
+    print("🔍 Testing unparsable greeting...")
+
+    async def run(simulator):
+        connection = lib.connection.AsyncMaxCubeConnection(*simulator.address, persistent=True)
+        cube = lib.cube.MaxCube(connection, auto_init=False)
+        c_messages = simulator.c_messages
+        # A C: record too short to hold the temperatures
+        simulator.c_messages = lambda: ['C:%s,AQIDBAU=' % simulator.devices[0].rf_hex.lower()]
+        try:
+            await cube.async_init()
+            raise AssertionError('short C: record was parsed')
+        except IndexError:
+            pass
+        # The rest of the greeting must not be read as the next reply
+        assert not connection.is_connected()
+        assert cube.metadata_stale
+
+        simulator.c_messages = c_messages
+        await cube.async_update()
+        await cube.async_update()
+        await connection.async_disconnect()
+        return cube
+
+    with MaxCubeSimulator(rooms=1, thermostats=3, fragment_size=16) as simulator:
+        cube = asyncio.run(run(simulator))
+
+    assert simulator.connections == 2
+    assert simulator.commands == ['l:', 'q:'], simulator.commands
+    assert all(device.min_temperature == 5.0 for device in cube.devices)
+    print("✅ Unparsable greeting OK")
+    return True
+
+
+def test_reconnect_after_disconnect():
+    """A dropped session is re-established transparently"""
+    print("🔍 Testing reconnect after disconnect...")
+
+    with MaxCubeSimulator(rooms=1, thermostats=2, disconnect_after=1) as simulator:
+        connection = lib.connection.MaxCubeConnection(*simulator.address, persistent=True)
+        cube = lib.cube.MaxCube(connection)
+        cube.update()
+        simulator.devices[1].valve_position = 55
+        cube.update()
+        connection.disconnect()
+
+    assert simulator.connections == 2
+    assert cube.device_by_rf(simulator.devices[1].rf_hex).valve_position == 55
+    print("✅ Reconnect OK")
+    return True
+
+
+def test_cancelled_exchange_resyncs():
+    """A command cancelled before its reply arrived does not leak into the next exchange"""
+    print("🔍 Testing cancelled exchange...")
+
+    async def run(simulator):
+        connection = lib.connection.AsyncMaxCubeConnection(*simulator.address, persistent=True)
+        cube = lib.cube.MaxCube(connection, auto_init=False)
+        await cube.async_init()
+
+        simulator.latency = 0.3
+        write = asyncio.ensure_future(cube.async_set_temperature_mode(cube.devices[0], 24.0, 1))
+        await asyncio.sleep(0.1)
+        write.cancel()
+        try:
+            await write
+        except asyncio.CancelledError:
+            pass
+        # The S: reply is still on its way, the session must not be reused
+        assert not connection.is_connected()
+
+        simulator.latency = 0
+        simulator.devices[1].valve_position = 64
+        await cube.async_update()
+        await connection.async_disconnect()
+        return cube
+
+    with MaxCubeSimulator(rooms=1, thermostats=2) as simulator:
+        cube = asyncio.run(run(simulator))
+
+    assert simulator.connections == 2
+    assert cube.device_by_rf(simulator.devices[1].rf_hex).valve_position == 64
+    assert cube.command_discarded is None
+    print("✅ Cancelled exchange OK")
+    return True
+
+
+def test_metadata_changes_kept_until_taken():
+    """Changes seen by one dump survive a repeated dump until they are taken"""
+    print("🔍 Testing metadata changes across dumps...")
+
+    with MaxCubeSimulator(rooms=2, thermostats=1) as simulator:
+        connection = lib.connection.MaxCubeConnection(*simulator.address, persistent=True)
+        cube = lib.cube.MaxCube(connection)
+        assert len(cube.pop_metadata_changes().rooms_added) == 2
+
+        # The first dump sees the rename, the one that runs again after an
+        # interruption finds the model already matching
+        simulator.rooms[1] = 'Living Room'
+        cube.rescan()
+        cube.rescan()
+        cube.update()
+        changes = cube.pop_metadata_changes()
+        assert [room.name for room in changes.rooms_renamed] == ['Living Room'], changes
+        assert not changes.rooms_added and not changes.devices_added
+        assert not cube.metadata_changes
+        connection.disconnect()
+
+    print("✅ Metadata changes across dumps OK")
+    return True
+
+
+def test_capture_and_replay():
+    """A captured session replays into the same cube model without a socket"""
+    print("🔍 Testing capture and replay...")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'cube.cap')
+        capture = lib.capture.MaxCubeCaptureWriter(path)
+
+        with MaxCubeSimulator(rooms=2, thermostats=2, window_shutters=1, fragment_size=50) as simulator:
+            connection = lib.connection.MaxCubeConnection(*simulator.address, persistent=True, capture=capture)
+            live = lib.cube.MaxCube(connection)
+            simulator.devices[0].valve_position = 42
+            live.update()
+            live.set_temperature_mode(live.devices[0], 23.0, 1)
+            connection.disconnect()
+        capture.close()
+
+        directions = [record.direction for record in lib.capture.read_capture(path)]
+        assert directions[0] == lib.capture.DIRECTION_CONNECT
+        assert directions.count(lib.capture.DIRECTION_SENT) == 2
+        assert directions[-1] == lib.capture.DIRECTION_DISCONNECT
+
+        replay = lib.capture.MaxCubeReplayConnection(path)
+        cube = lib.cube.MaxCube(replay)
+        cube.update()
+        assert cube.set_temperature_mode(cube.devices[0], 23.0, 1)
+        replay.disconnect()
+
+    assert len(cube.devices) == len(live.devices) == 6
+    assert cube.device_by_rf(simulator.devices[0].rf_hex).valve_position == 42
+    assert cube.duty_cycle == live.duty_cycle
+    print("✅ Capture and replay OK")
+    return True
+
+
+def test_capture_rotation():
+    """Capture files rotate once they reach their size limit"""
+    print("🔍 Testing capture rotation...")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'cube.cap')
+        capture = lib.capture.MaxCubeCaptureWriter(path, max_bytes=200, backup_count=2)
+        for index in range(20):
+            capture.record(lib.capture.DIRECTION_RECEIVED, b'L:%02d' % index + b'x' * 40 + b'\r\n')
+        capture.close()
+
+        assert os.path.exists(path + '.1') and os.path.exists(path + '.2')
+        assert not os.path.exists(path + '.3')
+        assert os.path.getsize(path) <= 200
+        records = list(lib.capture.read_capture(path, include_rotated=True))
+        assert records[-1].data.startswith(b'L:19')
+        assert [r.timestamp for r in records] == sorted(r.timestamp for r in records)
+
+    print("✅ Capture rotation OK")
+    return True
+
+
+def test_snapshots_share_unchanged_devices():
+    """Per-poll snapshots reuse unchanged device states and list changed fields"""
+    print("🔍 Testing snapshots...")
+
+    with MaxCubeSimulator(rooms=2, thermostats=2, window_shutters=1) as simulator:
+        connection = lib.connection.MaxCubeConnection(*simulator.address, persistent=True)
+        cube = lib.cube.MaxCube(connection)
+        first = lib.snapshot.MaxCubeSnapshot.take(cube)
+
+        simulator.devices[0].valve_position = 99
+        simulator.devices[2].is_open = True
+        cube.update()
+        second = lib.snapshot.MaxCubeSnapshot.take(cube, first)
+        connection.disconnect()
+
+    changes = second.diff(first)
+    assert changes.devices == {
+        simulator.devices[0].rf_hex: ('valve_position',),
+        simulator.devices[2].rf_hex: ('is_open',),
+    }
+    assert not changes.devices_added and not changes.devices_removed
+    assert not changes.rooms_changed
+    assert second.devices[1] is first.devices[1]
+    assert second.rooms is first.rooms
+    assert first.device(simulator.devices[0].rf_hex).valve_position != 99
+    assert not second.diff(second)
+    print("✅ Snapshots OK")
+    return True
+
+
+def test_telemetry():
+    """Connections record connect, read and parse timings, sizes and reconnects"""
+    print("🔍 Testing telemetry...")
+
+    telemetry = lib.telemetry.MaxCubeTelemetry(window=4)
+    with MaxCubeSimulator(rooms=2, thermostats=2, disconnect_after=1) as simulator:
+        connection = lib.connection.MaxCubeConnection(
+            *simulator.address, persistent=True, telemetry=telemetry)
+        cube = lib.cube.MaxCube(connection)
+        for _ in range(5):
+            cube.update()
+        connection.disconnect()
+
+    histograms = telemetry.histograms
+    # Every session after the first was re-established after a dropped command
+    assert histograms['connect_time'].count == telemetry.counters['reconnects'] + 1
+    assert histograms['parse_time.hello'].count == histograms['connect_time'].count
+    assert histograms['read_time'].count > histograms['connect_time'].count
+    assert len(histograms['read_time'].samples) == 4
+    assert histograms['bytes_received'].total > 0
+    assert histograms['parse_time.live_status'].count >= 6
+    summary = telemetry.as_dict()
+    assert sum(count for _, count in summary['histograms']['read_time']['buckets']) == 4
+    assert summary['histograms']['read_time']['p50'] <= summary['histograms']['read_time']['max']
+    print("✅ Telemetry OK")
+    return True
+
+
+def run_simulator_tests():
+    """Run all simulator tests"""
+    print("🚀 Running simulated MAX! Cube tests...")
+
+    tests = [
+        ("Greeting and Live Poll", test_greeting_and_live_poll),
+        ("Framed Reads", test_framed_reads_do_not_wait_for_timeout),
+        ("Late Reply", test_late_reply_is_not_read_as_the_next),
+        ("Set Temperature", test_set_temperature_reply),
+        ("Fragmented Stream", test_fragmented_stream_async),
+        ("Unparsable Greeting", test_unparsable_greeting_resyncs),
+        ("Reconnect", test_reconnect_after_disconnect),
+        ("Cancelled Exchange", test_cancelled_exchange_resyncs),
+        ("Metadata Changes", test_metadata_changes_kept_until_taken),
+        ("Capture and Replay", test_capture_and_replay),
+        ("Capture Rotation", test_capture_rotation),
+        ("Snapshots", test_snapshots_share_unchanged_devices),
+        ("Telemetry", test_telemetry),
+    ]
+
+    passed = 0
+    for test_name, test_func in tests:
+        try:
+            if test_func():
+                passed += 1
+        except Exception as e:
+            print(f"❌ {test_name} FAILED with exception: {e}")
+            traceback.print_exc()
+
+    print(f"\nSIMULATOR TEST RESULTS: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = run_simulator_tests()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Regression tests for poll and command scheduling: adaptive intervals, retry
+backoff, the circuit breaker and duty cycle pacing. Runs without Home
+Assistant and without a real cube
+"""
+
+import sys
+import traceback
+
+from cube_simulator import MaxCubeSimulator, load_library
+
+lib = load_library()
+
+
+def test_adaptive_interval():
+    """Polls speed up on activity and back off to the maximum while quiet"""
+    print("🔍 Testing adaptive poll interval...")
+
+    with MaxCubeSimulator(rooms=1, thermostats=2, window_shutters=1) as simulator:
+        connection = lib.connection.MaxCubeConnection(*simulator.address, persistent=True)
+        cube = lib.cube.MaxCube(connection)
+        snapshots = [lib.snapshot.MaxCubeSnapshot.take(cube)]
+
+        def poll():
+            cube.update()
+            snapshots.append(lib.snapshot.MaxCubeSnapshot.take(cube, snapshots[-1]))
+            return snapshots[-1].diff(snapshots[-2]), snapshots[-1]
+
+        interval = lib.polling.AdaptivePollInterval(300, minimum=15, backoff=2)
+        simulator.duty_cycle = 0
+        quiet = [interval.update(*poll()) for _ in range(6)]
+        assert quiet == [300] * 6, quiet
+
+        assert interval.update(*poll(), pending_writes=True) == 15
+        assert [interval.update(*poll()) for _ in range(6)] == [30, 60, 120, 240, 300, 300]
+
+        simulator.devices[0].valve_position = 70
+        assert interval.update(*poll()) == 15
+        simulator.devices[-1].is_open = True
+        interval.interval = 300
+        assert interval.update(*poll()) == 15
+        # A window that closes is not worth fast polling
+        simulator.devices[-1].is_open = False
+        interval.interval = 300
+        assert interval.update(*poll()) == 300
+        connection.disconnect()
+
+    assert interval.fastest(None) == 15
+    assert interval.fastest(50) == 157.5
+    assert interval.fastest(150) == 300
+    print("✅ Adaptive poll interval OK")
+    return True
+
+
+def test_retry_backoff():
+    """Failed polls are retried after doubling, jittered delays"""
+    print("🔍 Testing retry backoff...")
+
+    policy = lib.polling.PollRetryPolicy(minimum=10, maximum=50, jitter=0.2, threshold=10, cooldown=900)
+    delays = [policy.record_failure() for _ in range(6)]
+    for delay, expected in zip(delays, [10, 20, 40, 50, 50, 50]):
+        assert expected * 0.8 <= delay <= expected * 1.2, delays
+    assert not policy.is_open and policy.allow_request()
+
+    exact = lib.polling.PollRetryPolicy(minimum=10, maximum=50, jitter=0, threshold=10)
+    assert [exact.record_failure() for _ in range(4)] == [10, 20, 40, 50]
+    exact.record_success()
+    assert exact.failures == 0 and exact.record_failure() == 10
+    print("✅ Retry backoff OK")
+    return True
+
+
+def test_circuit_breaker():
+    """The circuit opens after repeated failures and a trial poll decides on closing"""
+    print("🔍 Testing circuit breaker...")
+
+    policy = lib.polling.PollRetryPolicy(minimum=10, maximum=50, jitter=0.2, threshold=3, cooldown=100)
+    policy.record_failure()
+    policy.record_failure()
+    assert not policy.is_open
+    delay = policy.record_failure()
+    assert policy.is_open and 100 <= delay <= 120
+    assert not policy.allow_request()
+    assert 99 < policy.remaining_cooldown() <= 100
+
+    # The trial poll fails: open for another cooldown
+    policy.opened_at -= 100
+    assert policy.allow_request()
+    assert 100 <= policy.record_failure() <= 120
+    assert policy.is_open and not policy.allow_request()
+
+    # The next trial poll succeeds: closed again
+    policy.opened_at -= 100
+    assert policy.allow_request()
+    policy.record_success()
+    assert not policy.is_open and policy.failures == 0 and policy.remaining_cooldown() == 0
+    print("✅ Circuit breaker OK")
+    return True
+
+
+def test_breaker_fits_stale_budget():
+    """Derived cooldowns leave room for a trial poll before stale data runs out"""
+    print("🔍 Testing breaker cooldown within the stale budget...")
+
+    for budget in (300, 900, 1800, 3600):
+        policy = lib.polling.PollRetryPolicy.within_budget(budget)
+        worst_case = sum(
+            min(policy.maximum, policy.minimum * 2 ** failure) * (1 + policy.jitter)
+            for failure in range(policy.threshold - 1)
+        ) + policy.cooldown * (1 + policy.jitter)
+        assert worst_case < budget, (budget, worst_case)
+        assert policy.cooldown <= lib.polling.CIRCUIT_BREAKER_COOLDOWN
+    print("✅ Breaker cooldown within the stale budget OK")
+    return True
+
+
+class FakeClock(object):
+    """Monotonic clock that only moves when told to"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket():
+    """Bursts drain the bucket, tokens refill at a rate slowed by the duty cycle"""
+    print("🔍 Testing command token bucket...")
+
+    clock = FakeClock()
+    scheduler = lib.scheduler.DutyCycleScheduler(capacity=3, rate=0.5, clock=clock)
+    for _ in range(3):
+        assert scheduler.delay() == 0
+        scheduler.consume()
+    assert scheduler.delay() == 2.0
+
+    clock.now += 1
+    assert scheduler.delay() == 1.0
+    clock.now += 1
+    assert scheduler.delay() == 0
+    # The bucket never holds more than its capacity
+    clock.now += 100
+    for _ in range(3):
+        scheduler.consume()
+    assert scheduler.delay() == 2.0
+
+    # At 50% duty cycle tokens come in half as fast, at 100% a tenth as fast
+    scheduler.update(50, 40)
+    assert scheduler.delay() == 4.0
+    scheduler.update(100, 40)
+    assert abs(scheduler.delay() - 20.0) < 1e-9
+    print("✅ Command token bucket OK")
+    return True
+
+
+def test_duty_cycle_deferral():
+    """Low priority commands wait out a high duty cycle, everything waits for free slots"""
+    print("🔍 Testing duty cycle deferral...")
+
+    clock = FakeClock()
+    scheduler = lib.scheduler.DutyCycleScheduler(capacity=5, rate=1, high_water=80, defer=120, clock=clock)
+    scheduler.update(85, 10)
+    assert scheduler.delay(low_priority=False) == 0
+    assert scheduler.delay(low_priority=True) == 120
+    clock.now += 100
+    assert scheduler.delay(low_priority=True) == 20
+    clock.now += 20
+    assert scheduler.delay(low_priority=True) == 0
+
+    scheduler.update(40, 0)
+    assert scheduler.delay(low_priority=False) == 120
+    scheduler.update(40, 5)
+    assert scheduler.delay(low_priority=True) == 0
+
+    # Readings without a duty cycle leave the last one in place
+    scheduler.update(None, None)
+    assert scheduler.duty_cycle == 40 and scheduler.free_memory_slots == 5
+
+    # A reading seen again (polls do not refresh it) keeps its age
+    scheduler.update(40, 0, reading=7)
+    clock.now += 100
+    scheduler.update(40, 0, reading=7)
+    assert scheduler.delay() == 20
+    scheduler.update(40, 0, reading=8)
+    assert scheduler.delay() == 120
+
+    # With the defaults deferred commands are held back, not rejected
+    defaults = lib.scheduler.DutyCycleScheduler(clock=clock)
+    defaults.update(90, 10)
+    assert 0 < defaults.delay(low_priority=True) <= lib.const.COMMAND_MAX_DEFER
+    defaults.update(10, 0)
+    assert 0 < defaults.delay() <= lib.const.COMMAND_MAX_DEFER
+    print("✅ Duty cycle deferral OK")
+    return True
+
+
+def run_scheduling_tests():
+    """Run all scheduling tests"""
+    print("🚀 Running scheduling tests...")
+
+    tests = [
+        ("Adaptive Interval", test_adaptive_interval),
+        ("Retry Backoff", test_retry_backoff),
+        ("Circuit Breaker", test_circuit_breaker),
+        ("Breaker Within Stale Budget", test_breaker_fits_stale_budget),
+        ("Token Bucket", test_token_bucket),
+        ("Duty Cycle Deferral", test_duty_cycle_deferral),
+    ]
+
+    passed = 0
+    for test_name, test_func in tests:
+        try:
+            if test_func():
+                passed += 1
+        except Exception as e:
+            print(f"❌ {test_name} FAILED with exception: {e}")
+            traceback.print_exc()
+
+    print(f"\nSCHEDULING TEST RESULTS: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = run_scheduling_tests()
+    sys.exit(0 if success else 1)